@@ -1,9 +1,22 @@
 import logging
 from pyrogram import Client, enums
-from info import API_HASH, APP_ID, LOGGER, BOT_TOKEN
+from info import API_HASH, APP_ID, LOGGER, BOT_TOKEN, SYNC_ON_START, BM25_SEARCH
 from user import User
-from utils.database import ensure_indexes, get_restart_message, clear_restart_message
+from utils.database import (
+    ensure_indexes,
+    start_auto_backfill,
+    get_restart_message,
+    clear_restart_message,
+    pause_running_jobs_async,
+    get_links_async,
+    load_link_map,
+    LINKS,
+    SEARCH_INDEX
+)
 from plugins.newpost import register_userbot_handlers
+from plugins.jobs import resume_index_jobs
+from plugins.sync import sync_links
+from utils import shutdown_parser_pool
 from pyrogram.errors import FloodWait, MessageNotModified
 import asyncio
 
@@ -31,10 +44,18 @@ class Wroxen(Client):
         self.LOGGER(__name__).info(f"🤖 @{bot_details.username} started successfully!")
 
         await ensure_indexes()
+        start_auto_backfill()
+        await load_link_map()
+        if BM25_SEARCH:
+            SEARCH_INDEX.start()
+            self.LOGGER(__name__).info("📚 Loading in-memory search index in the background.")
 
         self.USER, self.USER_ID = await User().start()
         self.LOGGER(__name__).info("✅ Userbot started successfully!")
 
+        # Snapshot high-water marks before live posts can move them past the downtime gap.
+        links = await get_links_async() if SYNC_ON_START else []
+
         try:
             register_userbot_handlers(self.USER)
             self.LOGGER(__name__).info("📌 Userbot message handlers registered.")
@@ -43,6 +64,17 @@ class Wroxen(Client):
 
         await self._confirm_restart()
 
+        try:
+            resumed = await resume_index_jobs(self)
+            if resumed:
+                self.LOGGER(__name__).info(f"♻️ Resumed {resumed} index job(s).")
+        except Exception as e:
+            self.LOGGER(__name__).error(f"Failed to resume index jobs: {e}")
+
+        if links:
+            self._sync_task = asyncio.create_task(sync_links(self, links))
+            self.LOGGER(__name__).info(f"🔄 Catch-up sync started for {len(links)} link(s).")
+
     async def _confirm_restart(self):
         """Edit the restart message after successful restart."""
         chat_id, msg_id = await get_restart_message()
@@ -75,5 +107,9 @@ class Wroxen(Client):
             self.LOGGER(__name__).error(f"⚠️ Error confirming restart message: {e}", exc_info=True)
 
     async def stop(self, *args, **kwargs):
+        await pause_running_jobs_async()
+        LINKS.stop_watcher()
+        SEARCH_INDEX.stop()
         await super().stop(*args, **kwargs)
+        shutdown_parser_pool()
         self.LOGGER(__name__).info("🛑 Bot stopped. Bye.")       
@@ -24,6 +24,48 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_USERNAME = os.getenv("REDIS_USERNAME", None)
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
 
+# Bulk writes used by /index and /reindex
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "5"))
+INDEX_PARSE_WORKERS = int(os.getenv("INDEX_PARSE_WORKERS", "4"))
+INDEX_QUEUE_SIZE = int(os.getenv("INDEX_QUEUE_SIZE", "1000"))
+INDEX_PROGRESS_INTERVAL = float(os.getenv("INDEX_PROGRESS_INTERVAL", "10"))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "100"))
+INDEX_MEDIA_ONLY = os.getenv("INDEX_MEDIA_ONLY", "True").lower() in ("true", "1", "yes")
+# Follow indexed_chats with a change stream (replica set only) when running several instances
+LINK_WATCH = os.getenv("LINK_WATCH", "False").lower() in ("true", "1", "yes")
+SYNC_ON_START = os.getenv("SYNC_ON_START", "True").lower() in ("true", "1", "yes")
+
+# Caption parsing (PTT) process pool, 0 parses on a thread instead
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "2"))
+PARSE_BATCH_SIZE = int(os.getenv("PARSE_BATCH_SIZE", "64"))
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "50000"))
+# Scene-name fast path: "off" (PTT only), "compare" (PTT, log disagreements) or "on"
+FAST_PARSE_MODE = os.getenv("FAST_PARSE_MODE", "off").strip().lower()
+PERSIST_PARSE_CACHE = os.getenv("PERSIST_PARSE_CACHE", "False").lower() in ("true", "1", "yes")
+# Days a persisted parse is kept (TTL index on caption_parse_cache)
+PARSE_CACHE_TTL_DAYS = int(os.getenv("PARSE_CACHE_TTL_DAYS", "30"))
+
+# Redis result cache: zlib-compress entries of at least CACHE_COMPRESS_MIN bytes
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "True").lower() in ("true", "1", "yes")
+CACHE_COMPRESS_MIN = int(os.getenv("CACHE_COMPRESS_MIN", "512"))
+# In-process tier in front of Redis, bounded in bytes
+LOCAL_CACHE_BYTES = int(os.getenv("LOCAL_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Search totals: "exact", "capped" (stop counting at SEARCH_COUNT_CAP, shown as N+) or "none"
+SEARCH_COUNT_MODE = os.getenv("SEARCH_COUNT_MODE", "capped").strip().lower()
+SEARCH_COUNT_CAP = int(os.getenv("SEARCH_COUNT_CAP", "1000"))
+# Rewrite zero-hit queries to the closest words of the chat's titles
+FUZZY_SEARCH = os.getenv("FUZZY_SEARCH", "True").lower() in ("true", "1", "yes")
+FUZZY_MAX_DISTANCE = int(os.getenv("FUZZY_MAX_DISTANCE", "2"))
+# Serve searches from an in-process BM25 index per chat, Mongo stays the fallback
+BM25_SEARCH = os.getenv("BM25_SEARCH", "False").lower() in ("true", "1", "yes")
+# Searches slower than this land in the slow query log read by /indexadvisor
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "200"))
+# Store each source file once (chat_id = source chat) and resolve targets through
+# indexed_chats at search time; run /migrate shared once after turning it on
+SHARED_STORAGE = os.getenv("SHARED_STORAGE", "False").lower() in ("true", "1", "yes")
+
 logging.basicConfig(
     level=logging.INFO,
     format="[%(asctime)s - %(levelname)s] - %(name)s - %(message)s",
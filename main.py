@@ -1,4 +1,6 @@
-from bot import Wroxen 
+# parser pool workers (forkserver/spawn) re-import this module: start and even import the bot only here
+if __name__ == "__main__":
+    from bot import Wroxen
 
-app = Wroxen()
-app.run()
+    app = Wroxen()
+    app.run()
@@ -0,0 +1,67 @@
+import logging
+import humanize
+from pyrogram import Client, filters
+from utils.database import index_report_async
+from info import AUTHORIZED_USERS, SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+
+def _keys(key: dict) -> str:
+    return ", ".join(f"{field}:{direction}" for field, direction in key.items())
+
+
+@Client.on_message(filters.command("indexadvisor") & filters.user(AUTHORIZED_USERS))
+async def index_advisor(client, message):
+    """/indexadvisor — index usage, unused and missing indexes, slow query shapes."""
+    msg = await message.reply_text("🧭 Reading index stats...")
+    try:
+        report = await index_report_async()
+    except Exception as e:
+        logger.exception("index_report_async failed")
+        return await msg.edit_text(f"❌ Index advisor failed: {e}")
+
+    lines = ["<b>🧭 Index Advisor</b>\n", "📚 Indexes (ops since server start)"]
+    for i, index in enumerate(report["indexes"]):
+        branch = "└─" if i == len(report["indexes"]) - 1 else "├─"
+        lines.append(
+            f"   {branch} <code>{index['name']}</code>: {index['ops']} ops, "
+            f"{humanize.naturalsize(index['size'], binary=True)}"
+        )
+
+    if report["unused"]:
+        lines.append("\n🟡 Unused (candidates to drop)")
+        for index in report["unused"]:
+            lines.append(f"   • <code>{index['name']}</code> ({_keys(index['key'])})")
+    if report["legacy"]:
+        lines.append("\n🧹 Legacy single-field indexes (dropped by the next restart or /resetdb)")
+        for index in report["legacy"]:
+            lines.append(f"   • <code>{index['name']}</code>")
+    if report["unknown"]:
+        lines.append("\n❔ Not created by the bot")
+        for index in report["unknown"]:
+            lines.append(f"   • <code>{index['name']}</code> ({_keys(index['key'])})")
+    if report["missing"]:
+        lines.append("\n🔴 Missing: " + ", ".join(f"<code>{name}</code>" for name in report["missing"]))
+
+    lines.append(
+        f"\n🐢 Slow searches (≥ {SLOW_QUERY_MS}ms): {report['slow_logged']} logged"
+        + (f", {report['profiled']} profiled ({report['profiled_collscans']} COLLSCAN)" if report["profiled"] else "")
+    )
+    for shape in report["slow"]:
+        if shape.get("collscan") is None:
+            plan = f"explain failed: {shape.get('error')}"
+        elif shape["collscan"]:
+            plan = "🔴 COLLSCAN"
+        else:
+            plan = "via " + ", ".join(shape["indexes"])
+        lines.append(
+            f"   • <code>{shape['shape']}</code>\n"
+            f"     {shape['count']}×, avg {shape['avg_ms']:.0f}ms, max {shape['max_ms']:.0f}ms, {plan}"
+        )
+        if shape.get("suggest"):
+            lines.append(f"     💡 Add index ({', '.join(shape['suggest'])})")
+    if not report["slow"]:
+        lines.append("   └─ None since start ✅")
+
+    await msg.edit_text("\n".join(lines))
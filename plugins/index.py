@@ -1,22 +1,18 @@
-import asyncio
 import logging
 from pyrogram import Client, filters
-from pyrogram.enums import ChatMemberStatus, MessagesFilter, MessageMediaType, ChatType
+from pyrogram.enums import ChatMemberStatus, ChatType
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram.errors import RPCError, FloodWait
 from .search import clear_redis_for_chat
+from .jobs import ACTIVE_JOBS, run_index_job
 from utils.database import (
-    save_movie_async,
-    delete_chat_data_async,
-    mark_indexed_chat_async,
+    delete_link_data_async,
     unmark_indexed_chat_async,
-    is_source_linked_to_target
+    is_source_linked_to_target,
+    create_index_job_async
 )
-from utils import extract_details
 from info import AUTHORIZED_USERS
 
-INDEXING = {}
-BATCH_SIZE = 50
+INDEXING = ACTIVE_JOBS["index"]
 logger = logging.getLogger(__name__)
 
 
@@ -149,104 +145,28 @@ async def index_chat(client, message):
         reply_markup=keyboard
     )
 
-    INDEXING[user_id] = True
-    indexed = 0
-    errors = 0
-    unsupported = 0
-    skipped_uid = 0
-    duplicates = 0
-
     try:
-        async for msg in client.USER.search_messages(
-            source_chat_id,
-            filter=MessagesFilter.EMPTY
-        ):
-            try:
-                if not INDEXING.get(user_id):
-                    await progress.edit_text("🚫 Indexing cancelled.")
-                    return
-
-                if msg.id < start_msg_id or msg.id > last_msg_id:
-                    continue
-
-                if not msg.media or msg.media not in [MessageMediaType.VIDEO, MessageMediaType.DOCUMENT]:
-                    unsupported += 1
-                    continue
-
-                caption = (
-                    msg.caption
-                    or getattr(msg.video, "file_name", None)
-                    or getattr(msg.document, "file_name", None)
-                )
-                if not caption:
-                    unsupported += 1
-                    continue
-
-                file_uid = (
-                    getattr(msg.video, "file_unique_id", None)
-                    or getattr(msg.document, "file_unique_id", None)
-                )
-
-                if not file_uid:
-                    skipped_uid += 1
-                    continue
-
-                details = extract_details(caption)
-                result = await save_movie_async(
-                    chat_id=target_chat_id,
-                    title=details.get("title"),
-                    year=details.get("year"),
-                    quality=details.get("quality"),
-                    lang=details.get("lang"),
-                    print_type=details.get("print"),
-                    season=details.get("season"),
-                    episode=details.get("episode"),
-                    codec=details.get("codec"),
-                    caption=caption,
-                    link=msg.link,
-                    file_unique_id=file_uid
-                )
-
-                if result == "saved":
-                    indexed += 1
-                elif result == "duplicate":
-                    duplicates += 1
-                else:
-                    errors += 1
-
-                total = indexed + duplicates
-                if total % BATCH_SIZE == 0:
-                    await asyncio.sleep(2)
-                    await progress.edit_text(
-                        f"📈 Indexing Progress\n"
-                        f"✅ Indexed: {indexed}\n"
-                        f"⏩ Duplicates: {duplicates}\n"
-                        f"❎ Skipped (no UID): {skipped_uid}\n"                       
-                        f"⚠️ Unsupported: {unsupported}\n"
-                        f"❌ Failed: {errors}\n"
-                        f"From `{source_chat_id}` → `{target_chat_id}`",
-                        reply_markup=keyboard
-                    )
-
-            except FloodWait as fw:
-                await asyncio.sleep(fw.value)
-            except Exception as inner_e:
-                errors += 1
-                logger.warning(f"⚠️ Skipped message due to error: {inner_e}")
-
-        await mark_indexed_chat_async(target_chat_id, source_chat_id)
-        await progress.edit_text(
-            f"✅ Completed!\n\n📂 Indexed: <b>{indexed}</b>\n⏩ Duplicates: <b>{duplicates}</b>\n"
-            f"❎ Skipped (no UID): <b>{skipped_uid}</b>\nUnsupported: {unsupported}\n⚠️ Failed: <b>{errors}</b>\n"
-            f"Linked `{source_chat_id}` → `{target_chat_id}`"
+        job_id = await create_index_job_async(
+            "index", user_id, target_chat_id, source_chat_id,
+            start_msg_id, last_msg_id, progress.chat.id, progress.id
         )
-
     except Exception as e:
-        await progress.edit_text(f"❌ Error during indexing: {e}")
         logger.exception(e)
-
-    finally:
-        INDEXING.pop(user_id, None)
+        return await progress.edit_text(f"❌ Error during indexing: {e}")
+
+    await run_index_job(client, {
+        "_id": job_id,
+        "kind": "index",
+        "user_id": user_id,
+        "target_chat": target_chat_id,
+        "source_chat": source_chat_id,
+        "start_msg_id": start_msg_id,
+        "last_msg_id": last_msg_id,
+        "checkpoint": last_msg_id,
+        "counters": {},
+        "progress_chat": progress.chat.id,
+        "progress_msg": progress.id,
+    })
 
 
 @Client.on_callback_query(filters.regex(r"cancel_index_(\d+)"))
@@ -275,12 +195,13 @@ async def delete_indexed_pair(client, message):
     source_chat_id = int(parts[2])
 
     try:
-        mongo_deleted = await delete_chat_data_async(target_chat_id)
-        redis_deleted = await clear_redis_for_chat(target_chat_id)
+        mongo_deleted = await delete_link_data_async(target_chat_id, source_chat_id)
         await unmark_indexed_chat_async(target_chat_id, source_chat_id)
+        # after unlinking, so no search caches the pair in between
+        await clear_redis_for_chat(target_chat_id)
         await message.reply_text(
             f"🗑 MongoDB: Deleted <b>{mongo_deleted} records</b>\n"
-            f"🧹 Redis: Deleted {redis_deleted} keys\n"
+            f"🧹 Redis: Cached searches invalidated\n"
             f"🔗 Unlinked `{source_chat_id}` → `{target_chat_id}`"
         )
     except Exception as e:
@@ -0,0 +1,204 @@
+import time
+import asyncio
+import logging
+from html import escape
+from pyrogram import Client, filters
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from pyrogram.errors import FloodWait, MessageNotModified
+from utils.database import (
+    mark_indexed_chat_async,
+    ensure_indexes,
+    notify_chat_change,
+    storage_chat,
+    update_index_job_async,
+    get_index_jobs_async
+)
+from utils import run_index_pipeline
+from info import AUTHORIZED_USERS
+
+logger = logging.getLogger(__name__)
+
+# kind -> {user_id: keep_running}; plugins.index / plugins.reindex expose these
+# as INDEXING / REINDEXING and the cancel buttons flip them to False.
+ACTIVE_JOBS = {"index": {}, "reindex": {}}
+LABELS = {"index": "Indexing", "reindex": "Reindexing"}
+_TASKS = set()
+
+
+def _progress_text(kind, stats, source_chat, target_chat):
+    return (
+        f"📈 {LABELS[kind]} Progress\n"
+        f"✅ Indexed: {stats.indexed}\n"
+        f"⏩ Duplicates: {stats.duplicates}\n"
+        f"⏳ Pending write: {stats.pending}\n"
+        f"❎ Skipped (no UID): {stats.skipped_uid}\n"
+        f"⚠️ Unsupported: {stats.unsupported}\n"
+        f"❌ Failed: {stats.errors}\n"
+        f"📍 Checkpoint: {stats.checkpoint}\n"
+        f"{stats.timings()}\n"
+        f"From `{source_chat}` → `{target_chat}`"
+    )
+
+
+def _final_text(kind, stats, source_chat, target_chat):
+    title = "✅ Completed!" if kind == "index" else "✅ Reindex Completed!"
+    return (
+        f"{title}\n\n📂 Indexed: <b>{stats.indexed}</b>\n⏩ Duplicates: <b>{stats.duplicates}</b>\n"
+        f"❎ Skipped (no UID): <b>{stats.skipped_uid}</b>\nUnsupported: {stats.unsupported}\n"
+        f"⚠️ Failed: <b>{stats.errors}</b>\n"
+        f"{stats.timings()}\n"
+        f"🔗 Linked `{source_chat}` → `{target_chat}`"
+    )
+
+
+async def run_index_job(client, job: dict):
+    """
+    Run (or resume) a persisted /index or /reindex job.
+
+    The job's checkpoint and counters are saved on every progress tick, so
+    after a restart the job continues below the checkpoint and keeps
+    editing the same progress message.
+    """
+    kind = job["kind"]
+    user_id = job["user_id"]
+    job_id = job["_id"]
+    target_chat_id = job["target_chat"]
+    source_chat_id = job["source_chat"]
+    registry = ACTIVE_JOBS[kind]
+    registry[user_id] = True
+
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_{kind}_{user_id}")]
+    ])
+
+    async def edit(text, markup=None):
+        try:
+            await client.edit_message_text(
+                chat_id=job["progress_chat"],
+                message_id=job["progress_msg"],
+                text=text,
+                reply_markup=markup
+            )
+        except MessageNotModified:
+            pass
+
+    async def report(stats):
+        await update_index_job_async(job_id, checkpoint=stats.checkpoint, counters=stats.counters())
+        await edit(_progress_text(kind, stats, source_chat_id, target_chat_id), keyboard)
+
+    try:
+        stats = await run_index_pipeline(
+            client, source_chat_id, target_chat_id,
+            job["start_msg_id"], job["checkpoint"],
+            should_continue=lambda: bool(registry.get(user_id)),
+            on_progress=report,
+            counters=job.get("counters")
+        )
+        if stats.cancelled:
+            await update_index_job_async(
+                job_id, status="cancelled", checkpoint=stats.checkpoint, counters=stats.counters()
+            )
+            await edit(f"🚫 {LABELS[kind]} cancelled.\n📂 Indexed before cancel: <b>{stats.indexed}</b>")
+            return
+
+        if kind == "reindex":
+            # never drop indexes here: live posts and other jobs rely on unique_file_per_chat
+            await ensure_indexes()
+        # messages whose parse or write failed stay in flight: keep the mark below them for /sync
+        mark = stats.high_water if stats.in_flight else job.get("last_msg_id")
+        await mark_indexed_chat_async(target_chat_id, source_chat_id, mark)
+        await notify_chat_change(storage_chat(target_chat_id, source_chat_id))
+        fields = {"status": "completed"}
+        if stats.in_flight:
+            fields = {"status": "partial",
+                      "error": f"{len(stats.in_flight)} messages not stored, /sync retries them from {mark}"}
+        await update_index_job_async(
+            job_id, checkpoint=stats.checkpoint, counters=stats.counters(), **fields
+        )
+        text = _final_text(kind, stats, source_chat_id, target_chat_id)
+        if stats.in_flight:
+            text += f"\n⚠️ {len(stats.in_flight)} messages not stored, /sync retries them"
+        await edit(text)
+
+    except Exception as e:
+        await update_index_job_async(job_id, status="failed", error=str(e))
+        try:
+            await edit(f"❌ Error during {LABELS[kind].lower()}: {e}")
+        except Exception:
+            pass
+        logger.exception(e)
+
+    finally:
+        registry.pop(user_id, None)
+
+
+async def _run_jobs_in_turn(client, jobs: list):
+    """Run one user's jobs of one kind one after another (the cancel button holds one per user)."""
+    for job in jobs:
+        await update_index_job_async(job["_id"], status="running")
+        await run_index_job(client, job)
+
+
+async def resume_index_jobs(client):
+    """
+    Restart jobs that were running or paused when the process went down.
+    A user's jobs of the same kind resume one after another, oldest first.
+    """
+    jobs = await get_index_jobs_async(["running", "paused", "queued"])
+    queues = {}
+    for job in reversed(jobs):
+        if job["kind"] in ACTIVE_JOBS:
+            queues.setdefault((job["kind"], job["user_id"]), []).append(job)
+
+    resumed = 0
+    for (kind, user_id), queue in queues.items():
+        if ACTIVE_JOBS[kind].get(user_id):
+            continue
+
+        for position, job in enumerate(queue):
+            text = f"♻️ Resuming {LABELS[kind].lower()} from message {job['checkpoint']}..."
+            if position:
+                text = f"⏳ Queued: resumes after {position} earlier {LABELS[kind].lower()} job(s)."
+                await update_index_job_async(job["_id"], status="queued")
+            try:
+                await client.edit_message_text(
+                    chat_id=job["progress_chat"],
+                    message_id=job["progress_msg"],
+                    text=text
+                )
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                logger.warning(f"⚠️ Can't edit progress message of job {job['_id']}: {e}")
+            logger.info(f"♻️ Resuming {kind} job {job['_id']} at message {job['checkpoint']}")
+
+        task = asyncio.create_task(_run_jobs_in_turn(client, queue))
+        _TASKS.add(task)
+        task.add_done_callback(_TASKS.discard)
+        resumed += len(queue)
+    return resumed
+
+
+@Client.on_message(filters.command("jobs") & filters.user(AUTHORIZED_USERS))
+async def list_jobs(client, message):
+    """/jobs — list running, queued, paused, partial and failed index jobs."""
+    jobs = await get_index_jobs_async(["running", "queued", "paused", "partial", "failed"], limit=20)
+    if not jobs:
+        return await message.reply_text("ℹ️ No running, queued, paused, partial or failed jobs.")
+
+    icons = {"running": "🟢", "queued": "⏳", "paused": "⏸", "partial": "🟡", "failed": "🔴"}
+    lines = ["<b>📋 Index Jobs</b>\n"]
+    for job in jobs:
+        counters = job.get("counters") or {}
+        age = int(time.time() - job.get("updated_at", time.time()))
+        lines.append(
+            f"{icons.get(job['status'], '•')} <b>{job['kind']}</b> "
+            f"<code>{job['source_chat']}</code> → <code>{job['target_chat']}</code>\n"
+            f"   ├─ Status: {job['status']} ({age}s ago)\n"
+            f"   ├─ Range: {job['start_msg_id']}..{job['last_msg_id']}, at {job['checkpoint']}\n"
+            f"   └─ Indexed: {counters.get('indexed', 0)}, Dupes: {counters.get('duplicates', 0)}, "
+            f"Failed: {counters.get('errors', 0)}"
+        )
+        if job.get("error"):
+            lines.append(f"   ⚠️ {escape(job['error'][:200])}")
+    await message.reply_text("\n".join(lines))
@@ -0,0 +1,57 @@
+import time
+import logging
+from pyrogram import Client, filters
+from pyrogram.errors import MessageNotModified
+from utils.database import backfill_tokens_async, backfill_episode_fields_async, collapse_shared_storage_async
+from info import AUTHORIZED_USERS
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = {
+    "tokens": ("search tokens", backfill_tokens_async),
+    "seasons": ("season/episode ranges", backfill_episode_fields_async),
+    "shared": ("shared per-source storage", collapse_shared_storage_async),
+}
+RUNNING = set()
+
+
+@Client.on_message(filters.command("migrate") & filters.user(AUTHORIZED_USERS))
+async def migrate_command(client, message):
+    """/migrate <name> [force] — backfill fields added after docs were stored."""
+    parts = message.text.split()
+    if len(parts) < 2 or parts[1] not in MIGRATIONS:
+        return await message.reply_text(
+            f"Usage: `/migrate <name> [force]`\nAvailable: {', '.join(MIGRATIONS)}"
+        )
+
+    name = parts[1]
+    force = len(parts) > 2 and parts[2].lower() == "force"
+    if name in RUNNING:
+        return await message.reply_text(f"⚠️ Migration `{name}` is already running.")
+
+    label, migrate = MIGRATIONS[name]
+    msg = await message.reply_text(f"🧩 Backfilling {label}...")
+    last_edit = 0
+
+    async def progress(updated):
+        nonlocal last_edit
+        if time.time() - last_edit < 10:
+            return
+        last_edit = time.time()
+        try:
+            await msg.edit_text(f"🧩 Backfilling {label}...\n✅ Updated: {updated}")
+        except MessageNotModified:
+            pass
+
+    RUNNING.add(name)
+    started = time.time()
+    try:
+        updated = await migrate(on_progress=progress, force=force)
+        await msg.edit_text(
+            f"✅ Migration `{name}` done.\n📂 Updated: <b>{updated}</b> docs in {time.time() - started:.1f}s"
+        )
+    except Exception as e:
+        logger.exception(f"Migration {name} failed")
+        await msg.edit_text(f"❌ Migration `{name}` failed: {e}")
+    finally:
+        RUNNING.discard(name)
@@ -1,8 +1,8 @@
 import logging
 from pyrogram import filters
 from pyrogram.types import Message
-from utils.database import is_source_in_db, save_movie_async
-from utils import extract_details
+from utils.database import is_source_in_db, save_movie_async, bump_high_water_async, storage_chat
+from utils import extract_details_async
 
 logger = logging.getLogger(__name__)
 
@@ -28,12 +28,15 @@ def register_userbot_handlers(user_client):
                 or getattr(message.document, "file_unique_id", None)
             )
 
-            details = extract_details(msg_caption)
+            details = await extract_details_async(msg_caption)
 
-            for target_chat in target_chats:
+            # one shared copy under the source, or one copy per target
+            storage = {storage_chat(target_chat, from_chat) for target_chat in target_chats}
+            stored = True
+            for chat_id in storage:
                 try:
-                    await save_movie_async(
-                        chat_id=target_chat,
+                    status = await save_movie_async(
+                        chat_id=chat_id,
                         title=details.get("title"),
                         year=details.get("year"),
                         quality=details.get("quality"),
@@ -46,9 +49,18 @@ def register_userbot_handlers(user_client):
                         link=message.link,
                         file_unique_id=file_uid
                     )
-                    logger.info(f"✅ Auto-indexed post from {from_chat} → {target_chat}")
+                    if status == "error":
+                        stored = False
+                        continue
+                    logger.info(f"✅ Auto-indexed post from {from_chat} → {chat_id}")
                 except Exception as inner_e:
-                    logger.warning(f"⚠️ Failed to save for target {target_chat}: {inner_e}")
+                    stored = False
+                    logger.warning(f"⚠️ Failed to save for {chat_id}: {inner_e}")
+
+            # a post that wasn't saved everywhere stays above the mark for /sync to retry;
+            # behind a gap (downtime, other posts) only /sync moves the mark
+            if stored:
+                await bump_high_water_async(from_chat, message.id, contiguous=True)
 
         except Exception as e:
             logger.exception(f"⚠️ Auto-index error: {e}")
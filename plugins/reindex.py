@@ -1,26 +1,22 @@
 from pyrogram import Client, filters
-from pyrogram.enums import ChatMemberStatus, MessageMediaType, MessagesFilter
-from pyrogram.errors import RPCError, FloodWait
+from pyrogram.enums import ChatMemberStatus
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import asyncio
 import logging
 
 from .search import clear_redis_for_chat
+from .jobs import ACTIVE_JOBS, run_index_job
 from info import AUTHORIZED_USERS
 from utils.database import (
-    delete_chat_data_async,
-    mark_indexed_chat_async,
-    save_movie_async,
-    rebuild_indexes,
-    is_source_linked_to_target
+    delete_link_data_async,
+    is_source_linked_to_target,
+    create_index_job_async
 )
-from utils import extract_details
 
 logger = logging.getLogger(__name__)
 
-REINDEXING = {}
+REINDEXING = ACTIVE_JOBS["reindex"]
 PENDING_DELETE_CONFIRM = {}  # store pending confirmation per user
-BATCH_SIZE = 50
 
 
 @Client.on_message(filters.command("reindex"))
@@ -196,9 +192,9 @@ async def handle_delete_confirm(client, callback_query):
 async def start_reindex(client, message, user_id, target_chat_id, source_chat_id, start_msg_id, last_msg_id, delete_old_data):
     if delete_old_data:
         await message.reply_text(f"🗑️ Deleting old MongoDB and Redis data for `{target_chat_id}`...")
-        deleted_mongo = await delete_chat_data_async(chat_id=target_chat_id)
-        deleted_redis = await clear_redis_for_chat(target_chat_id)
-        await message.reply_text(f"✅ Deleted {deleted_mongo} Mongo docs and {deleted_redis} Redis keys.")
+        deleted_mongo = await delete_link_data_async(target_chat_id, source_chat_id)
+        await clear_redis_for_chat(target_chat_id)
+        await message.reply_text(f"✅ Deleted {deleted_mongo} Mongo docs and invalidated cached searches.")
     else:
         await message.reply_text("✅ Skipped data deletion. Existing entries will remain intact.")
 
@@ -211,102 +207,33 @@ async def start_reindex(client, message, user_id, target_chat_id, source_chat_id
         reply_markup=keyboard
     )
 
-    REINDEXING[user_id] = True
-
-    indexed = 0
-    duplicates = 0
-    errors = 0
-    unsupported = 0
-
     try:
-        async for msg in client.USER.search_messages(
-            source_chat_id,
-            filter=MessagesFilter.EMPTY,
-            offset=0
-        ):
-            if not REINDEXING.get(user_id):
-                await progress.edit_text("🚫 Indexing cancelled.")
-                return
-
-            if msg.id < start_msg_id or msg.id > last_msg_id:
-                continue
-
-            if not msg.media or msg.media not in [MessageMediaType.VIDEO, MessageMediaType.DOCUMENT]:
-                unsupported += 1
-                continue
-
-            msg_caption = (
-                msg.caption
-                or getattr(msg.video, "file_name", None)
-                or getattr(msg.document, "file_name", None)
-            )
-            if not msg_caption:
-                unsupported += 1
-                continue
-
-            file_uid = (
-                getattr(msg.video, "file_unique_id", None)
-                or getattr(msg.document, "file_unique_id", None)
-            )
-
-            try:
-                details = extract_details(msg_caption)
-                result = await save_movie_async(
-                    chat_id=target_chat_id,
-                    title=details.get("title"),
-                    year=details.get("year"),
-                    quality=details.get("quality"),
-                    lang=details.get("lang"),
-                    print_type=details.get("print"),
-                    season=details.get("season"),
-                    episode=details.get("episode"),
-                    codec=details.get("codec"),
-                    caption=msg_caption,
-                    link=msg.link,
-                    file_unique_id=file_uid
-                )
-
-                if result == "saved":
-                    indexed += 1
-                elif result == "duplicate":
-                    duplicates += 1
-                else:
-                    errors += 1
-
-                total = indexed + duplicates
-                if total % BATCH_SIZE == 0:
-                    await asyncio.sleep(2)
-                    await progress.edit_text(
-                        f"📈 Reindexing Progress\n"
-                        f"✅ Indexed: {indexed}\n"
-                        f"⏩ Duplicates: {duplicates}\n"
-                        f"⚠️ Unsupported: {unsupported}\n"
-                        f"❌ Failed: {errors}\n"
-                        f"From `{source_chat_id}` → `{target_chat_id}`",
-                        reply_markup=keyboard
-                    )
-
-            except FloodWait as fw:
-                await asyncio.sleep(fw.value)
-            except Exception as inner_e:
-                errors += 1
-                logger.warning(f"⚠️ Skipped message due to error: {inner_e}")
-
-        await rebuild_indexes()
-        await mark_indexed_chat_async(target_chat_id, source_chat_id)
-
-        await progress.edit_text(
-            f"✅ Reindex Completed!\n\n"
-            f"📂 Indexed: {indexed}\n"
-            f"⏩ Duplicates: {duplicates}\n"
-            f"⚠️ Unsupported: {unsupported}\n"
-            f"❌ Failed: {errors}\n"
-            f"🔗 `{source_chat_id}` → `{target_chat_id}`"
+        job_id = await create_index_job_async(
+            "reindex", user_id, target_chat_id, source_chat_id,
+            start_msg_id, last_msg_id, progress.chat.id, progress.id
         )
-
     except Exception as e:
-        await progress.edit_text(f"❌ Error during reindex: {e}")
         logger.exception(e)
-
-    finally:
-        REINDEXING.pop(user_id, None)
+        return await progress.edit_text(f"❌ Error during reindex: {e}")
+
+    await run_index_job(client, {
+        "_id": job_id,
+        "kind": "reindex",
+        "user_id": user_id,
+        "target_chat": target_chat_id,
+        "source_chat": source_chat_id,
+        "start_msg_id": start_msg_id,
+        "last_msg_id": last_msg_id,
+        "checkpoint": last_msg_id,
+        "counters": {},
+        "progress_chat": progress.chat.id,
+        "progress_msg": progress.id,
+    })
+
+
+@Client.on_callback_query(filters.regex(r"cancel_reindex_(\d+)"))
+async def cancel_reindex_callback(client, callback_query):
+    user_id = int(callback_query.matches[0].group(1))
+    REINDEXING[user_id] = False
+    await callback_query.answer("Cancelled!", show_alert=True)
+    await callback_query.message.edit_text("🚫 Reindexing cancelled.")
@@ -1,73 +1,356 @@
-import json
+import os
+import math
+import time
 import hashlib
 from html import escape
-from bson import ObjectId
 from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from utils.database import get_movies_async as get_movies, is_chat_linked_async
+from utils.database import (
+    get_movies_async as get_movies,
+    count_movies_async,
+    search_cursor,
+    is_chat_linked_async,
+    dependent_chats_async,
+    on_chat_change
+)
+from utils.cache import pack_entry, unpack_entry, trim_result, LocalCache
+from utils.query import normalize_query
+from utils.fuzzy import suggest_query
 import redis.asyncio as redis
-from info import REDIS_HOST, REDIS_PORT, REDIS_USERNAME, REDIS_PASSWORD
+from redis.exceptions import RedisError
+from info import (
+    REDIS_HOST, REDIS_PORT, REDIS_USERNAME, REDIS_PASSWORD,
+    SEARCH_COUNT_MODE, LOCAL_CACHE_BYTES
+)
 from pyrogram.errors import FloodWait, MessageNotModified
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 rdb = redis.Redis(
     host=REDIS_HOST,
     port=REDIS_PORT,
     username=REDIS_USERNAME,
     password=REDIS_PASSWORD,
-    decode_responses=True
+    decode_responses=False,  # cache entries are binary, see utils.cache
+    socket_timeout=3,
+    socket_connect_timeout=3
 )
 
 CACHE_TTL = 600       
 RESULTS_PER_PAGE = 10  
-MAX_RESULTS = 500 
+PREFETCH_PAGES = 3    # pages fetched per Mongo round trip
+LOCK_TTL_MS = 5000    # cross-instance single-flight lock
+LOCK_WAIT = 3         # seconds to wait for another instance's fetch
+REDIS_RETRY_AFTER = 30  # seconds to skip Redis after an error
+GEN_REFRESH = 1       # seconds a chat generation is trusted locally
+_COUNT_TASKS = set()
+_INFLIGHT = {}
+_GENERATIONS = {}     # chat_id -> (generation, read at)
+REDIS_DOWN = object()
+REDIS_STATE = {"down_until": 0, "hits": 0, "misses": 0, "errors": 0}
+LOCAL_CACHE = LocalCache(LOCAL_CACHE_BYTES)
+# chat_id -> [hits, misses] of page lookups, for /checkbot
+CHAT_CACHE_STATS = {}
 
-class JSONEncoder(json.JSONEncoder):
-    """Make ObjectId JSON serializable."""
-    def default(self, o):
-        if isinstance(o, ObjectId):
-            return str(o)
-        return super().default(o)
+def make_cache_key(chat_id: int, query: str, generation: int = 0) -> str:
+    """Generate a unique Redis key for a user's query (spelling variants share it)."""
+    raw = f"{chat_id}:{generation}:{normalize_query(query)}"
+    return "movie_search:" + hashlib.md5(raw.encode()).hexdigest()
 
 
-def make_cache_key(chat_id: int, query: str) -> str:
-    """Generate a unique Redis key for a user's query."""
-    raw = f"{chat_id}:{query.strip().lower()}"
-    return "movie_search:" + hashlib.md5(raw.encode()).hexdigest()
+async def get_generation(chat_id: int) -> int:
+    """
+    The chat's cache generation, re-read from Redis at most every
+    GEN_REFRESH seconds. Local bumps apply at once. While Redis is down,
+    the last known value is used; once it answers, its value wins, also
+    when lower (flushdb, restart, eviction), so other instances' bumps
+    are seen.
+    """
+    cached = _GENERATIONS.get(chat_id)
+    now = time.monotonic()
+    if cached and now - cached[1] < GEN_REFRESH:
+        return cached[0]
 
+    value = await redis_call(lambda: rdb.get(f"chat_gen:{chat_id}"))
+    if value is REDIS_DOWN:
+        return cached[0] if cached else 0
+    generation = int(value or 0)
+    _GENERATIONS[chat_id] = (generation, now)
+    return generation
 
-async def get_cached_results(chat_id: int, query: str):
-    """Fetch cached search results from Redis."""
-    key = make_cache_key(chat_id, query)
-    raw = await rdb.get(key)
-    return json.loads(raw) if raw else None
 
+async def cache_key_for(chat_id: int, query: str) -> str:
+    """Cache key of a query under the chat's current generation."""
+    return make_cache_key(chat_id, query, await get_generation(chat_id))
 
-async def set_cached_results(chat_id: int, query: str, results: list):
+
+async def redis_call(op):
     """
-    Cache search results in Redis with a per-chat tracking set.
+    Run `op()` against Redis, or return REDIS_DOWN without trying while a
+    recent failure is being waited out. Searches keep working from the
+    local tier (and Mongo) during a Redis outage.
     """
-    key = make_cache_key(chat_id, query)
-    payload = json.dumps({"results": results, "total": len(results)}, cls=JSONEncoder)
+    if time.monotonic() < REDIS_STATE["down_until"]:
+        return REDIS_DOWN
+    try:
+        return await op()
+    except (RedisError, OSError) as e:
+        REDIS_STATE["errors"] += 1
+        REDIS_STATE["down_until"] = time.monotonic() + REDIS_RETRY_AFTER
+        logger.warning(f"⚠️ Redis unavailable ({e}), serving from local cache for {REDIS_RETRY_AFTER}s")
+        return REDIS_DOWN
+
+
+async def cache_get(*keys) -> list:
+    """Unpacked entries for keys: local tier first, one MGET for the rest."""
+    raws = [LOCAL_CACHE.get(key) for key in keys]
+    missing = [key for key, raw in zip(keys, raws) if raw is None]
+    if missing:
+        fetched = await redis_call(lambda: rdb.mget(*missing))
+        if fetched is not REDIS_DOWN:
+            found = dict(zip(missing, fetched))
+            for i, key in enumerate(keys):
+                raw = found.get(key)
+                if raw is not None:
+                    REDIS_STATE["hits"] += 1
+                    LOCAL_CACHE.put(key, raw, CACHE_TTL)
+                    raws[i] = raw
+                elif key in found:
+                    REDIS_STATE["misses"] += 1
+    return [unpack_entry(raw) for raw in raws]
+
+
+async def cache_set(entries: dict):
+    """Pack and store entries in both tiers, Redis writes in one pipeline."""
+    packed = {key: pack_entry(value) for key, value in entries.items()}
+    for key, raw in packed.items():
+        LOCAL_CACHE.put(key, raw, CACHE_TTL)
 
-    await rdb.setex(key, CACHE_TTL, payload)
-    await rdb.sadd(f"chat_cache_keys:{chat_id}", key)
+    async def write():
+        async with rdb.pipeline(transaction=False) as pipe:
+            for key, raw in packed.items():
+                pipe.setex(key, CACHE_TTL, raw)
+            await pipe.execute()
+    await redis_call(write)
 
 
-async def clear_redis_for_chat(chat_id: int):
+async def cache_delete(*keys):
+    for key in keys:
+        LOCAL_CACHE.delete(key)
+    await redis_call(lambda: rdb.delete(*keys))
+
+
+async def get_cached_page(key: str, page: int):
     """
-    Efficiently clear all Redis cache entries belonging to a chat.
-    Deletes both cache keys and the chat tracking set.
+    Fetch a query's meta entry (total, page cursors) and one cached page
+    in a single round trip. Either may be None.
     """
-    set_key = f"chat_cache_keys:{chat_id}"
-    keys = await rdb.smembers(set_key)
-    if not keys:
-        return 0
+    meta, entry, exact = await cache_get(f"{key}:meta", f"{key}:p{page}", f"{key}:total")
+    if meta and exact is not None:
+        # counted after meta was written, see fill_exact_total
+        meta.update(total=exact, capped=False)
+    return meta, entry
+
+
+async def set_cached_pages(key: str, meta: dict, pages: dict = None):
+    """Cache a query's meta entry and some of its pages."""
+    entries = {f"{key}:meta": meta}
+    for page, entry in (pages or {}).items():
+        entries[f"{key}:p{page}"] = entry
+    await cache_set(entries)
+
+
+async def get_rendered_page(key: str, page: int):
+    """Cached HTML of a page plus whether it has a next page, or None."""
+    return (await cache_get(f"{key}:r{page}"))[0]
+
+
+async def set_rendered_page(key: str, page: int, rendered: dict):
+    await cache_set({f"{key}:r{page}": rendered})
+
+
+async def clear_redis_for_chat(chat_id: int, docs: list = None):
+    """
+    Invalidate every cached search of a chat by bumping its generation.
+
+    Cache keys embed the generation, so old entries are simply never read
+    again and expire on their own. Returns the new generation.
+    """
+    generation = await redis_call(lambda: rdb.incr(f"chat_gen:{chat_id}"))
+    if generation is REDIS_DOWN:
+        generation = _GENERATIONS.get(chat_id, (0, 0))[0] + 1
+    _GENERATIONS[chat_id] = (generation, time.monotonic())
+    return generation
+
+
+async def flush_search_cache():
+    """Drop every cached search: the Redis db and this process's tier and generations."""
+    await rdb.flushdb()
+    LOCAL_CACHE.clear()
+    _GENERATIONS.clear()
+
+
+@on_chat_change
+async def invalidate_searches(chat_id: int, docs: list = None):
+    """
+    Change hook run on every save, bulk flush and delete: clear the cached
+    searches of every chat reading these docs (the linked targets too with
+    SHARED_STORAGE).
+    """
+    for chat in await dependent_chats_async(chat_id):
+        await clear_redis_for_chat(chat)
+
+
+def search_tier_stats() -> dict:
+    """Hit/miss/eviction counters of the local and Redis cache tiers."""
+    return {
+        "local": LOCAL_CACHE.stats(),
+        "redis": {
+            "hits": REDIS_STATE["hits"],
+            "misses": REDIS_STATE["misses"],
+            "errors": REDIS_STATE["errors"],
+            "degraded": time.monotonic() < REDIS_STATE["down_until"],
+        },
+    }
+
+
+def record_cache_lookup(chat_id: int, hit: bool):
+    stats = CHAT_CACHE_STATS.setdefault(chat_id, [0, 0])
+    stats[0 if hit else 1] += 1
+
+
+def search_cache_stats(top: int = 5) -> list:
+    """(chat_id, hits, misses, hit ratio %) of the chats with the most lookups."""
+    busiest = sorted(CHAT_CACHE_STATS.items(), key=lambda item: -sum(item[1]))[:top]
+    return [(chat_id, hits, misses, hits / (hits + misses) * 100) for chat_id, (hits, misses) in busiest]
+
+
+def format_total(total, capped: bool = False) -> str:
+    return f"{total}+" if capped else str(total)
+
+
+async def fill_exact_total(chat_id: int, query: str, key: str, match: str):
+    """
+    Count a query whose cached total is capped, after the first page is out.
+
+    The count goes to its own key, which get_cached_page lays over meta,
+    so cursors fetch_pages stores meanwhile are never overwritten.
+    """
+    total = await count_movies_async(chat_id, query, match)
+    await cache_set({f"{key}:total": total})
+    meta, _ = await get_cached_page(key, 1)
+    if meta:
+        # rendered pages carry the old total in their header
+        await cache_delete(*(f"{key}:r{page}" for page in range(1, len(meta["cursors"]) + 2)))
+
+
+async def fetch_pages(chat_id: int, query: str, page: int, key: str, meta: dict = None):
+    """
+    Load PREFETCH_PAGES pages starting at `page` from Mongo and cache them.
+
+    Pages after the first continue from the cursor stored in `meta` for
+    the previous page, so Mongo never skips over earlier results. The
+    total is only counted when there is no meta entry yet. Returns
+    (entry of `page` or None if its cursor is unknown, meta).
+    """
+    after = None
+    if page > 1:
+        after = (meta or {}).get("cursors", {}).get(str(page - 1))
+        if not after:
+            return None, meta
+
+    count_mode = "none"
+    if meta is None:
+        # An exact count is deferred: reply with a capped total, count afterwards.
+        count_mode = "capped" if SEARCH_COUNT_MODE == "exact" else SEARCH_COUNT_MODE
+
+    # a typo-corrected query replaces the user's for every page
+    search_query = (meta or {}).get("rewritten") or query
+    data = await get_movies(
+        chat_id, search_query, limit=RESULTS_PER_PAGE * PREFETCH_PAGES,
+        count_mode=count_mode, after=after, match=(meta or {}).get("match", "text")
+    )
+    rewritten = None
+    if meta is None and not data["results"]:
+        rewritten = await suggest_query(chat_id, query)
+        if rewritten:
+            search_query = rewritten
+            data = await get_movies(
+                chat_id, rewritten, limit=RESULTS_PER_PAGE * PREFETCH_PAGES, count_mode=count_mode
+            )
+
+    results = data["results"]
+    if meta is None:
+        # "match" says whether these cursors continue a text or a prefix search
+        meta = {"total": data["total"], "capped": data["capped"], "match": data["match"], "cursors": {}}
+        if rewritten and results:
+            meta["rewritten"] = rewritten
+        if data["capped"] and SEARCH_COUNT_MODE == "exact":
+            task = asyncio.create_task(fill_exact_total(chat_id, search_query, key, data["match"]))
+            _COUNT_TASKS.add(task)
+            task.add_done_callback(_COUNT_TASKS.discard)
+
+    pages = {}
+    for i in range(PREFETCH_PAGES):
+        chunk = results[i * RESULTS_PER_PAGE:(i + 1) * RESULTS_PER_PAGE]
+        last = (i + 1) * RESULTS_PER_PAGE >= len(results)
+        if chunk:
+            meta["cursors"][str(page + i)] = search_cursor(chunk[-1])
+        pages[page + i] = {
+            "results": [trim_result(doc) for doc in chunk],
+            "has_next": data["has_more"] if last else True
+        }
+        if last:
+            break
+
+    await set_cached_pages(key, meta, pages)
+    return pages[page], meta
+
+
+RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+async def fetch_pages_once(chat_id: int, query: str, page: int, key: str, meta: dict = None):
+    """
+    fetch_pages with identical concurrent misses coalesced.
+
+    Callers in this process await the same task; other instances are held
+    off by a short Redis lock and pick the pages up from the cache.
+    """
+    flight = f"{key}:{page}"
+    task = _INFLIGHT.get(flight)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_pages_locked(chat_id, query, page, key, meta))
+        _INFLIGHT[flight] = task
+        task.add_done_callback(lambda _: _INFLIGHT.pop(flight, None))
+    # shield: one impatient caller must not cancel the fetch for the others
+    return await asyncio.shield(task)
+
+
+async def _fetch_pages_locked(chat_id: int, query: str, page: int, key: str, meta: dict = None):
+    lock_key = f"{key}:lock{page}"
+    token = os.urandom(8).hex()
+    locked = await redis_call(lambda: rdb.set(lock_key, token, nx=True, px=LOCK_TTL_MS))
+    if locked is REDIS_DOWN:
+        return await fetch_pages(chat_id, query, page, key, meta)
+    if locked:
+        try:
+            return await fetch_pages(chat_id, query, page, key, meta)
+        finally:
+            await redis_call(lambda: rdb.eval(RELEASE_LOCK, 1, lock_key, token))
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+        cached_meta, entry = await get_cached_page(key, page)
+        if entry is not None:
+            return entry, cached_meta
+    # the lock holder is slow or gone, fetch it ourselves
+    return await fetch_pages(chat_id, query, page, key, meta)
+
 
-    await rdb.delete(*keys)
-    await rdb.delete(set_key)
-    return len(keys)
-    
 @Client.on_message(filters.group & filters.text)
 async def search_movie(client, message):
     if not message.from_user:
@@ -78,6 +361,12 @@ async def search_movie(client, message):
     
     if not query or query.startswith(("/", ".", "!", ",")):
         return
+
+    # "Avengers: Endgame" and "endgame avengers" share one cache entry and search;
+    # the reply still shows what the user typed
+    search_query = normalize_query(query)
+    if not search_query:
+        return
     
     linked = await is_chat_linked_async(chat_id)
     if not linked:
@@ -85,37 +374,58 @@ async def search_movie(client, message):
         
     user_id = message.from_user.id
 
-    cache_data = await get_cached_results(chat_id, query)
-    if cache_data:
-        results = cache_data["results"]
-        total = cache_data["total"]
-    else:
-        mongo_data = await get_movies(chat_id, query, page=1, limit=MAX_RESULTS)
-        results = mongo_data["results"]
-        total = mongo_data["total"]
+    rendered, error = await load_page(chat_id, search_query, 1, new_search=True)
+    if error:
+        return 
 
-        await set_cached_results(chat_id, query, results)
+    await send_results(message, query, chat_id, user_id, 1, rendered, edit=False)
 
-    if not results:
-        return 
-        
-    pages = max(1, (len(results) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE)
 
-    await send_results(
-        message, query, chat_id, user_id, 1, results, total, pages,
-        edit=False
-    )
+async def load_page(chat_id: int, query: str, page: int, new_search: bool = False):
+    """
+    A page ready to send: the rendered cache first, else render it from
+    the cached (or freshly fetched) results and cache the HTML.
 
-async def send_results(
-    message, query, chat_id, user_id, page,
-    all_results, total, pages, edit=False
-):
+    Returns (rendered, error) with error "expired" when the result set is
+    gone (only a new search may start one) or "empty" for a page without
+    results.
+    """
+    key = await cache_key_for(chat_id, query)
+    rendered = await get_rendered_page(key, page)
+    if rendered:
+        record_cache_lookup(chat_id, True)
+        return rendered, None
+
+    meta, entry = await get_cached_page(key, page)
+    if meta is None and not new_search:
+        return None, "expired"
+    record_cache_lookup(chat_id, entry is not None)
+    if entry is None:
+        entry, meta = await fetch_pages_once(chat_id, query, page, key, meta)
+        if entry is None:
+            return None, "expired"
+    if not entry["results"]:
+        return None, "empty"
+
+    rendered = render_results(page, entry, meta)
+    await set_rendered_page(key, page, rendered)
+    return rendered, None
+
+
+def render_results(page: int, entry: dict, meta: dict) -> dict:
+    """A page's HTML without the "Results for" header: spellings of one query share it."""
     start = (page - 1) * RESULTS_PER_PAGE
-    end = start + RESULTS_PER_PAGE
-    movies = all_results[start:end]
+    movies = entry["results"]
+    total, capped = meta.get("total"), meta.get("capped", False)
 
-    text = f"<b>Results for:</b> <code>{escape(query)}</code>\n"
-    text += f"📄 Page {page}/{pages} — Total: {total}\n\n"
+    text = ""
+    if meta.get("rewritten"):
+        text += f"🔤 Showing results for <code>{escape(meta['rewritten'])}</code>\n"
+    if total is None:
+        text += f"📄 Page {page}\n\n"
+    else:
+        pages = max(1, math.ceil(total / RESULTS_PER_PAGE))
+        text += f"📄 Page {page}/{format_total(pages, capped)} — Total: {format_total(total, capped)}\n\n"
 
     for i, movie in enumerate(movies, start=start + 1):
 
@@ -143,16 +453,33 @@ async def send_results(
         if link:
             text += f"<b>Link:</b> {link}\n\n"
 
+    return {"text": text, "has_next": bool(entry.get("has_next"))}
+
+
+def page_callback(chat_id: int, query: str, page: int, user_id: int) -> str:
+    """Callback data of a page button, with the typed query unless it won't fit (64 bytes, no "|")."""
+    data = f"page|{chat_id}|{query}|{page}|{user_id}"
+    if "|" in query or len(data.encode()) > 64:
+        data = f"page|{chat_id}|{normalize_query(query)}|{page}|{user_id}"
+    return data
+
+
+async def send_results(
+    message, query, chat_id, user_id, page,
+    rendered, edit=False
+):
+    text = f"<b>Results for:</b> <code>{escape(query)}</code>\n" + rendered["text"]
+
     # Pagination buttons
     buttons = []
     row = []
     if page > 1:
         row.append(
-            InlineKeyboardButton("⬅️ Prev", callback_data=f"page|{chat_id}|{query}|{page-1}|{user_id}")
+            InlineKeyboardButton("⬅️ Prev", callback_data=page_callback(chat_id, query, page - 1, user_id))
         )
-    if page < pages:
+    if rendered["has_next"]:
         row.append(
-            InlineKeyboardButton("Next ➡️", callback_data=f"page|{chat_id}|{query}|{page+1}|{user_id}")
+            InlineKeyboardButton("Next ➡️", callback_data=page_callback(chat_id, query, page + 1, user_id))
         )
     if row:
         buttons.append(row)
@@ -197,21 +524,19 @@ async def pagination_handler(client, query: CallbackQuery):
     if user_id != owner_id:
         return await query.answer("⚠️ Not For You!", show_alert=True)
 
-    cache_data = await get_cached_results(chat_id, search_query)
-    if not cache_data:
-        return await query.answer("⏳ Cache expired! Please search again.", show_alert=True)
-
-    all_results = cache_data["results"]
-    total = cache_data["total"]
-    pages = max(1, (len(all_results) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE)
+    if page < 1:
+        return await query.answer("⚠️ Invalid page.", show_alert=True)
 
-    if page < 1 or page > pages:
+    rendered, error = await load_page(chat_id, normalize_query(search_query), page)
+    if error == "expired":
+        return await query.answer("⏳ Cache expired! Please search again.", show_alert=True)
+    if error:
         return await query.answer("⚠️ Invalid page.", show_alert=True)
 
     try:
         await send_results(
             query.message, search_query, chat_id, owner_id, page,
-            all_results, total, pages, edit=True
+            rendered, edit=True
         )
         await query.answer()
     except FloodWait as e:
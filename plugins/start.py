@@ -5,11 +5,13 @@ import asyncio
 from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import RPCError
-from utils.database import collection, ensure_indexes, INDEXED_COLL, RESTART_COLL, add_restart_message
+from utils.database import collection, ensure_indexes, INDEXED_COLL, RESTART_COLL, add_restart_message, load_link_map, LINKS, SEARCH_INDEX
 from redis.exceptions import ConnectionError as RedisConnectionError
 from motor.motor_asyncio import AsyncIOMotorClient
-from .search import rdb, clear_redis_for_chat
-from info import AUTHORIZED_USERS
+from .search import rdb, clear_redis_for_chat, flush_search_cache, search_cache_stats, search_tier_stats
+from info import AUTHORIZED_USERS, SHARED_STORAGE
+from utils import parser_cache_stats, fast_parse_stats, fuzzy_stats
+from utils.fuzzy import TITLE_VOCAB
 import logging
 
 logger = logging.getLogger(__name__)
@@ -38,6 +40,12 @@ async def start_command(client, message):
         "<b>Utility Commands</b>\n"
         "<code>/resetdb</code> – Clean MongoDB database\n"
         "<code>/reindex</code> – Reindex all chat messages\n"
+        "<code>/jobs</code> – Running, queued, paused, partial & failed index jobs\n"
+        "<code>/sync</code> – Index posts missed while offline\n"
+        "<code>/migrate tokens</code> – Backfill search tokens of old records\n"
+        "<code>/migrate seasons</code> – Backfill season/episode ranges of old records\n"
+        "<code>/migrate shared</code> – Collapse per-target copies into one per source\n"
+        "<code>/indexadvisor</code> – Unused & missing indexes, slow searches\n"
         "<code>/clearcache</code> – Clear Redis cache (specific chat)\n"
         "<code>/restart</code> – Pull latest commits & restart bot\n"
         "<code>/flushredis</code> – Clear <b>entire</b> Redis database\n\n"
@@ -87,7 +95,7 @@ async def handle_flush_callback(client, query):
         return
 
     try:
-        await rdb.flushdb()
+        await flush_search_cache()
         await query.message.edit_text("✅ Successfully cleared the entire Redis database.")
     except Exception as e:
         await query.message.edit_text(f"❌ Error while flushing Redis:\n<code>{e}</code>")
@@ -110,11 +118,8 @@ async def clear_cache_cmd(client, message):
     msg = await message.reply_text("🧹 Clearing Redis cache, please wait...")
 
     try:
-        deleted = await clear_redis_for_chat(chat_id)
-        if deleted == 0:
-            await msg.edit_text(f"ℹ️ No Redis keys found for `{chat_id}`.")
-        else:
-            await msg.edit_text(f"✅ Cleared `{deleted}` Redis cache keys for chat `{chat_id}`.")
+        generation = await clear_redis_for_chat(chat_id)
+        await msg.edit_text(f"✅ Invalidated cached searches for chat `{chat_id}` (generation {generation}).")
     except RPCError as e:
         await msg.edit_text(f"⚠️ Telegram RPC Error: {e}")
     except Exception as e:
@@ -139,7 +144,13 @@ async def resetdb_handler(client, message):
         await INDEXED_COLL.drop()
         await RESTART_COLL.drop()
         await ensure_indexes()
-        await rdb.flushdb()
+        await load_link_map()
+        await flush_search_cache()
+        # in-process copies of the dropped movies
+        TITLE_VOCAB.clear()
+        if SEARCH_INDEX.enabled:
+            SEARCH_INDEX.stop()
+            SEARCH_INDEX.start()
         await msg.edit_text("✅ Database reset successfully!\nAll data wiped and indexes rebuilt.")
 
         logger.info("✅ Database reset by user %s", user_id)
@@ -196,6 +207,7 @@ async def checkbot_handler(client, message):
         status_lines.append("🟢 MongoDB: Connected")
         status_lines.append(f"   ├─ Collections: {coll_count}")
         status_lines.append(f"   ├─ Documents: {obj_count}")
+        status_lines.append(f"   ├─ Movie Storage: {'shared per source' if SHARED_STORAGE else 'copy per target'}")
         status_lines.append(f"   ├─ Data Size: {mongo_data}")
         status_lines.append(f"   ├─ Storage: {mongo_storage}")
         status_lines.append(f"   ├─ Index: {mongo_index}")
@@ -238,6 +250,69 @@ async def checkbot_handler(client, message):
     except Exception as e:
         status_lines.append(f"🔴 Redis: Failed ({e})")
 
+    tiers = search_tier_stats()
+    local, remote = tiers["local"], tiers["redis"]
+    status_lines.append("🧊 Search Cache Tiers" + (" (⚠️ Redis down, local only)" if remote["degraded"] else ""))
+    status_lines.append(
+        f"   ├─ Local: {local['entries']} entries, "
+        f"{humanize.naturalsize(local['bytes'], binary=True)} / {humanize.naturalsize(local['max_bytes'], binary=True)}"
+    )
+    status_lines.append(
+        f"   ├─ Local Hits: {local['hits']}, Misses: {local['misses']}, "
+        f"Evictions: {local['evictions']} ({local['hit_ratio']:.2f}%)"
+    )
+    status_lines.append(
+        f"   └─ Redis Hits: {remote['hits']}, Misses: {remote['misses']}, Errors: {remote['errors']}"
+    )
+
+    chat_stats = search_cache_stats()
+    if chat_stats:
+        status_lines.append("📊 Search Cache by Chat")
+        for i, (chat_id, hits, misses, ratio) in enumerate(chat_stats):
+            branch = "└─" if i == len(chat_stats) - 1 else "├─"
+            status_lines.append(f"   {branch} <code>{chat_id}</code>: {ratio:.1f}% ({hits} hits, {misses} misses)")
+
+    parse_stats = parser_cache_stats()
+    tier = "memory + mongo" if parse_stats["persistent"] else "memory"
+    status_lines.append(f"🧠 Caption Parse Cache ({tier})")
+    status_lines.append(f"   ├─ Entries: {parse_stats['size']} / {parse_stats['max_size']}")
+    status_lines.append(f"   ├─ Hits: {parse_stats['memory_hits']} memory, {parse_stats['persistent_hits']} mongo")
+    status_lines.append(f"   ├─ Misses: {parse_stats['misses']}")
+    status_lines.append(f"   └─ Hit Ratio: {parse_stats['hit_ratio']:.2f}%")
+
+    fast = fast_parse_stats()
+    if fast["mode"] == "on":
+        status_lines.append(f"⚡ Fast Parser: on ({fast['fast']} fast, {fast['fallback']} via PTT)")
+    elif fast["mode"] == "compare":
+        status_lines.append(
+            f"⚡ Fast Parser: compare ({fast['disagreed']}/{fast['compared']} disagree with PTT)"
+        )
+
+    if LINKS.loaded:
+        status_lines.append(f"🗺️ Chat Links (in memory): {len(LINKS)}")
+
+    fuzzy = fuzzy_stats()
+    if fuzzy["enabled"]:
+        status_lines.append(
+            f"🔤 Fuzzy Search: {fuzzy['words']} words in {fuzzy['chats']} chats "
+            f"({fuzzy['entries']} index entries), {fuzzy['rewrites']}/{fuzzy['lookups']} queries rewritten"
+        )
+
+    engine = SEARCH_INDEX.stats()
+    if engine["enabled"]:
+        status_lines.append(
+            f"📚 Memory Search: {engine['docs']} docs in {len(engine['chats'])} chats, "
+            f"{humanize.naturalsize(engine['bytes'], binary=True)}"
+            + (f", {engine['loading']} loading" if engine["loading"] else "")
+            + f", {engine['searches']} searches served"
+        )
+        largest = sorted(engine["chats"].items(), key=lambda item: item[1][1], reverse=True)[:5]
+        for i, (chat_id, (docs, size)) in enumerate(largest):
+            branch = "└─" if i == len(largest) - 1 else "├─"
+            status_lines.append(
+                f"   {branch} <code>{chat_id}</code>: {docs} docs, {humanize.naturalsize(size, binary=True)}"
+            )
+
     try:
         indexes = await collection.index_information()
         if "movie_text_index" in indexes:
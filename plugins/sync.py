@@ -0,0 +1,91 @@
+import logging
+from pyrogram import Client, filters
+from utils.database import get_links_async, bump_high_water_async, storage_chat
+from utils import run_index_pipeline
+from info import AUTHORIZED_USERS
+
+logger = logging.getLogger(__name__)
+
+SYNCING = {"running": False}
+
+
+async def sync_links(client, links: list = None) -> list:
+    """
+    Catch up every link from its high-water mark to the newest message.
+
+    Only messages newer than `last_msg_id` are fetched, so recovering from
+    downtime costs a few history pages per source. Links storing into the
+    same chat (every target of a source with SHARED_STORAGE) share one
+    fetch from their lowest mark. Links without a mark (indexed before
+    marks existed and never posted to since) are skipped.
+    Returns one (link, stats or None) tuple per link.
+    """
+    if SYNCING["running"]:
+        return []
+
+    SYNCING["running"] = True
+    results = []
+    try:
+        if links is None:
+            links = await get_links_async()
+
+        groups = {}
+        for link in links:
+            if not link.get("last_msg_id"):
+                results.append((link, None))
+                continue
+            storage = storage_chat(link["target_chat"], link["source_chat"])
+            groups.setdefault((storage, link["source_chat"]), []).append(link)
+
+        for (storage, source_chat), group in groups.items():
+            target_chat = group[0]["target_chat"]
+            mark = min(link["last_msg_id"] for link in group)
+            try:
+                stats = await run_index_pipeline(
+                    client, source_chat, target_chat, mark + 1, None,
+                    should_continue=lambda: True
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Sync {source_chat} → {storage} failed: {e}")
+                results.extend((link, None) for link in group)
+                continue
+
+            for link in group:
+                # only as far as every message below is written, failed ones are retried next time
+                if stats.high_water and stats.high_water > link["last_msg_id"]:
+                    await bump_high_water_async(source_chat, stats.high_water, link["target_chat"])
+                results.append((link, stats))
+            logger.info(
+                f"🔄 Synced {source_chat} → {storage} from {mark} for {len(group)} link(s): "
+                f"+{stats.indexed} new, {stats.duplicates} dupes"
+            )
+    finally:
+        SYNCING["running"] = False
+
+    return results
+
+
+@Client.on_message(filters.command("sync") & filters.user(AUTHORIZED_USERS))
+async def sync_command(client, message):
+    """/sync — index posts newer than each link's high-water mark."""
+    if SYNCING["running"]:
+        return await message.reply_text("⚠️ A sync is already running.")
+
+    msg = await message.reply_text("🔄 Syncing all linked chats...")
+    results = await sync_links(client)
+    if not results:
+        return await msg.edit_text("ℹ️ No linked chats to sync.")
+
+    lines = ["<b>🔄 Sync Report</b>\n"]
+    for link, stats in results:
+        pair = f"<code>{link['source_chat']}</code> → <code>{link['target_chat']}</code>"
+        if stats is None:
+            mark = link.get("last_msg_id")
+            reason = "failed" if mark else "no high-water mark, run /reindex once"
+            lines.append(f"⚠️ {pair}: {reason}")
+        else:
+            lines.append(
+                f"✅ {pair}: +{stats.indexed} new, {stats.duplicates} dupes, "
+                f"{stats.errors} failed ({stats.elapsed:.1f}s)"
+            )
+    await msg.edit_text("\n".join(lines))
@@ -1 +1,29 @@
-from .extractor import extract_details
+import importlib
+
+# Loaded on first use: parser pool workers import utils.extractor, and must
+# not pull in the settings, database and bot modules through this package.
+_EXPORTS = {
+    "extract_details": ".extractor",
+    "normalize_query": ".query",
+    "tokenize": ".query",
+    "extract_details_async": ".parser",
+    "extract_details_batch_async": ".parser",
+    "shutdown_parser_pool": ".parser",
+    "parser_cache_stats": ".parser",
+    "fast_parse_stats": ".parser",
+    "run_index_pipeline": ".indexer",
+    "message_caption": ".indexer",
+    "message_file_uid": ".indexer",
+    "suggest_query": ".fuzzy",
+    "fuzzy_stats": ".fuzzy",
+}
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module, __name__), name)
+
+
+__all__ = list(_EXPORTS)
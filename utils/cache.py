@@ -0,0 +1,122 @@
+import zlib
+import time
+import logging
+from collections import OrderedDict
+import msgpack
+from bson import ObjectId
+from info import CACHE_COMPRESSION, CACHE_COMPRESS_MIN
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the cached layout changes; entries of other versions read as misses.
+CACHE_FORMAT = 3
+_RAW = 0
+_ZLIB = 1
+
+# Only what send_results renders is cached
+RENDERED_FIELDS = ("title", "year", "quality", "lang", "print", "season", "episode", "codec", "link")
+
+
+def trim_result(doc: dict) -> dict:
+    return {k: doc[k] for k in RENDERED_FIELDS if doc.get(k) is not None}
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Can't cache {type(obj).__name__}")
+
+
+def pack_entry(value) -> bytes:
+    """msgpack a cache value behind a 2-byte header (format version, compression)."""
+    body = msgpack.packb(value, default=_default, use_bin_type=True)
+    flag = _RAW
+    if CACHE_COMPRESSION and len(body) >= CACHE_COMPRESS_MIN:
+        packed = zlib.compress(body, 6)
+        if len(packed) < len(body):
+            body, flag = packed, _ZLIB
+    return bytes((CACHE_FORMAT, flag)) + body
+
+
+def unpack_entry(raw: bytes):
+    """Inverse of pack_entry; None for missing, foreign-format or corrupt entries."""
+    if not raw or len(raw) < 2 or raw[0] != CACHE_FORMAT:
+        return None
+    try:
+        body = raw[2:]
+        if raw[1] == _ZLIB:
+            body = zlib.decompress(body)
+        elif raw[1] != _RAW:
+            return None
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    except Exception as e:
+        logger.warning(f"⚠️ Dropping unreadable cache entry: {e}")
+        return None
+
+
+class LocalCache:
+    """
+    In-process LRU of packed cache entries, bounded by total bytes, with a
+    per-entry TTL. Sits in front of Redis and keeps serving when Redis is down.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(0, max_bytes)
+        self.bytes = 0
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires, raw = item
+        if expires <= time.monotonic():
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return raw
+
+    def put(self, key: str, raw: bytes, ttl: float):
+        # an entry too big to keep still replaces the old one
+        self._drop(key)
+        if len(raw) > self.max_bytes:
+            return
+        self._data[key] = (time.monotonic() + ttl, raw)
+        self.bytes += len(raw)
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self._drop(key)
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def _drop(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.bytes -= len(item[1])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / lookups * 100) if lookups else 0,
+        }
@@ -1,18 +1,47 @@
 from .database import (
     save_movie_async, 
+    build_movie_doc, 
     delete_chat_data_async, 
     get_movies_async, 
+    count_movies_async,
+    search_cursor,
+    backfill_tokens_async,
+    backfill_episode_fields_async,
+    collapse_shared_storage_async,
+    start_auto_backfill,
+    tokenize,
     ensure_indexes, 
     mark_indexed_chat_async, 
+    bump_high_water_async, 
+    get_links_async, 
     unmark_indexed_chat_async, 
     is_source_linked_to_target, 
     is_source_in_db,
     collection, 
     is_chat_linked_async, 
+    storage_chat,
+    storage_chats_async,
+    dependent_chats_async,
+    delete_link_data_async,
     INDEXED_COLL,
+    LINKS,
+    load_link_map,
+    SEARCH_INDEX,
+    on_chat_change,
+    notify_chat_change,
     rebuild_indexes, 
     add_restart_message, 
     get_restart_message, 
     clear_restart_message, 
-    RESTART_COLL
-)      
+    RESTART_COLL,
+    PARSE_CACHE_COLL,
+    get_parsed_captions,
+    save_parsed_captions,
+    JOBS_COLL,
+    create_index_job_async,
+    update_index_job_async,
+    get_index_jobs_async,
+    pause_running_jobs_async
+)
+from .bulk import MovieBatchWriter
+from .advisor import index_report_async
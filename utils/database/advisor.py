@@ -0,0 +1,142 @@
+import logging
+from info import DB_NAME, COLLECTION_NAME, SLOW_QUERY_MS
+from .database import db, collection, MOVIE_INDEXES, LEGACY_INDEXES, SLOW_QUERIES
+
+logger = logging.getLogger(__name__)
+
+# Kept even when never read: they enforce uniqueness
+ENFORCING_INDEXES = {"_id_", "unique_file_per_chat"}
+
+
+def _plan_stages(plan: dict) -> list:
+    """(stage, index name) of every stage in an explain plan tree."""
+    stages = [(plan.get("stage"), plan.get("indexName"))]
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def _winning_plan(explain: dict) -> dict:
+    """winningPlan of an aggregate explain, wherever the server version puts it."""
+    if "queryPlanner" in explain:
+        return explain["queryPlanner"].get("winningPlan", {})
+    for stage in explain.get("stages", []):
+        cursor = stage.get("$cursor")
+        if cursor:
+            return cursor.get("queryPlanner", {}).get("winningPlan", {})
+    return {}
+
+
+def suggest_index(match: dict) -> list:
+    """
+    Compound index for a filter following equality-sort-range: chat_id,
+    the other equality fields, then the search sort (season_num, ep_start,
+    ep_end), as in chat_episode_range.
+    """
+    keys = ["chat_id"]
+    for field, value in match.items():
+        if field.startswith("$") or field in keys:
+            continue
+        if not isinstance(value, dict) or "$in" in value:
+            keys.append(field)
+    keys += [f for f in ("season_num", "ep_start", "ep_end") if f not in keys]
+    return keys
+
+
+async def _index_usage() -> list:
+    """$indexStats with sizes: [{name, key, ops, since, size}] ordered by name."""
+    sizes = {}
+    try:
+        stats = await collection.aggregate([{"$collStats": {"storageStats": {}}}]).to_list(length=1)
+        if stats:
+            sizes = stats[0].get("storageStats", {}).get("indexSizes", {})
+    except Exception as e:
+        logger.warning(f"⚠️ Index sizes unavailable: {e}")
+
+    usage = {}
+    async for stat in collection.aggregate([{"$indexStats": {}}]):
+        name = stat["name"]
+        accesses = stat.get("accesses", {})
+        # sharded / replica hosts each report their own counters
+        entry = usage.setdefault(name, {"name": name, "key": dict(stat.get("key", {})),
+                                        "ops": 0, "since": accesses.get("since"),
+                                        "size": sizes.get(name, 0)})
+        entry["ops"] += accesses.get("ops", 0)
+    return sorted(usage.values(), key=lambda i: i["name"])
+
+
+async def _profiled_queries(limit: int = 50) -> list:
+    """Slow operations on the movie collection from system.profile, if profiling is on."""
+    try:
+        return await db["system.profile"].find(
+            {"ns": f"{DB_NAME}.{COLLECTION_NAME}", "millis": {"$gte": SLOW_QUERY_MS}},
+            {"millis": 1, "planSummary": 1, "docsExamined": 1, "keysExamined": 1, "nreturned": 1, "ts": 1}
+        ).sort("ts", -1).limit(limit).to_list(length=limit)
+    except Exception as e:
+        logger.info(f"system.profile unavailable: {e}")
+        return []
+
+
+async def _explain_shape(pipeline: list) -> dict:
+    explain = await db.command(
+        "explain", {"aggregate": COLLECTION_NAME, "pipeline": pipeline, "cursor": {}},
+        verbosity="queryPlanner"
+    )
+    stages = _plan_stages(_winning_plan(explain))
+    return {
+        "collscan": any(stage == "COLLSCAN" for stage, _ in stages),
+        "indexes": sorted({name for _, name in stages if name}),
+    }
+
+
+async def index_report_async(top: int = 5) -> dict:
+    """
+    What /indexadvisor shows: index usage, indexes never used since the
+    server started, legacy and unknown indexes, and the slowest query
+    shapes of the in-process slow query log with the plan each got and an
+    index suggestion when that plan scanned the collection.
+    """
+    indexes = await _index_usage()
+    managed = {options["name"] for _, options in MOVIE_INDEXES}
+    unused = [i for i in indexes if i["ops"] == 0 and i["name"] not in ENFORCING_INDEXES]
+    legacy = [i for i in indexes if i["name"] in LEGACY_INDEXES]
+    unknown = [i for i in indexes if i["name"] not in managed | ENFORCING_INDEXES | set(LEGACY_INDEXES)]
+    present = {i["name"] for i in indexes}
+    missing = sorted(managed - present)
+
+    shapes = {}
+    for entry in SLOW_QUERIES:
+        shape = shapes.setdefault(entry["shape"], {"shape": entry["shape"], "count": 0, "total_ms": 0,
+                                                   "max_ms": 0, "pipeline": entry["pipeline"]})
+        shape["count"] += 1
+        shape["total_ms"] += entry["ms"]
+        if entry["ms"] >= shape["max_ms"]:
+            shape["max_ms"], shape["pipeline"] = entry["ms"], entry["pipeline"]
+
+    slow = sorted(shapes.values(), key=lambda s: s["total_ms"], reverse=True)[:top]
+    for shape in slow:
+        pipeline = shape.pop("pipeline")
+        shape["avg_ms"] = shape["total_ms"] / shape["count"]
+        try:
+            shape.update(await _explain_shape(pipeline))
+        except Exception as e:
+            shape.update(collscan=None, indexes=[], error=str(e))
+        match = pipeline[0]["$match"]
+        if shape.get("collscan") and "$text" not in match:
+            shape["suggest"] = suggest_index(match)
+
+    profiled = await _profiled_queries()
+    return {
+        "indexes": indexes,
+        "unused": unused,
+        "legacy": legacy,
+        "unknown": unknown,
+        "missing": missing,
+        "slow": slow,
+        "slow_logged": len(SLOW_QUERIES),
+        "profiled": len(profiled),
+        "profiled_collscans": sum(1 for p in profiled if "COLLSCAN" in (p.get("planSummary") or "")),
+    }
@@ -0,0 +1,365 @@
+import sys
+import math
+import time
+import heapq
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# Stored per doc, in this order, to render results without Mongo
+DOC_FIELDS = ("title", "year", "quality", "lang", "print", "season", "episode", "codec", "link",
+              "season_num", "ep_start", "ep_end", "is_complete")
+_SEASON_NUM, _EP_START, _EP_END, _IS_COMPLETE = range(9, 13)
+# Few distinct values, share one string object per value
+_INTERNED = {"quality", "lang", "print", "codec"}
+
+# Extra term frequency for words of these fields, mirroring movie_text_index weights
+FIELD_BOOST = {"title": 4, "codec": 1}
+K1 = 1.2
+B = 0.75
+MAX_TF = 0xFFFF
+
+
+def sort_value(value):
+    """Mongo's ascending order across types: null, numbers, strings."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value))
+
+
+class ChatIndex:
+    """
+    Inverted index of one chat's movies.
+
+    Docs are numbered in insertion order; each term keeps two parallel
+    arrays (doc numbers ascending, term frequencies), so a posting costs
+    6 bytes and AND queries bisect the longer lists instead of building sets.
+    """
+
+    def __init__(self, tokens_of):
+        self.tokens_of = tokens_of
+        self.postings = {}
+        self.lengths = array("H")
+        self.oids = bytearray()
+        self.fields = []
+        self.total_length = 0
+        self._terms = None
+        self._field_bytes = 0
+
+    def __len__(self):
+        return len(self.fields)
+
+    def add(self, doc: dict):
+        doc_no = len(self.fields)
+        freqs = {}
+        for term in doc.get("tokens") or self.tokens_of(doc):
+            freqs[term] = 1
+        for field, boost in FIELD_BOOST.items():
+            value = doc.get(field)
+            if value:
+                for term in self.tokens_of({field: value}):
+                    if term in freqs:
+                        freqs[term] += boost
+
+        length = 0
+        for term, tf in freqs.items():
+            tf = min(tf, MAX_TF)
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("I"), array("H"))
+                self._terms = None
+            posting[0].append(doc_no)
+            posting[1].append(tf)
+            length += tf
+
+        self.lengths.append(min(length, MAX_TF))
+        self.total_length += length
+        self.oids += doc["_id"].binary
+        values = []
+        for field in DOC_FIELDS:
+            value = doc.get(field)
+            if field in _INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            elif isinstance(value, str):
+                self._field_bytes += len(value)
+            values.append(value)
+        self.fields.append(tuple(values))
+
+    def to_doc(self, doc_no: int, score=None) -> dict:
+        doc = {k: v for k, v in zip(DOC_FIELDS, self.fields[doc_no]) if v is not None}
+        doc["_id"] = ObjectId(bytes(self.oids[doc_no * 12:doc_no * 12 + 12]))
+        if score is not None:
+            doc["score"] = score
+        return doc
+
+    def tie_key(self, doc_no: int) -> tuple:
+        """Order of equally scored docs, as in the Mongo search: season_num, ep_start, ep_end, _id asc."""
+        fields = self.fields[doc_no]
+        return (
+            sort_value(fields[_SEASON_NUM]),
+            sort_value(fields[_EP_START]),
+            sort_value(fields[_EP_END]),
+            self.oids[doc_no * 12:doc_no * 12 + 12],
+        )
+
+    def has_episode(self, doc_no: int, episode: int) -> bool:
+        """The doc is that episode, a pack whose range holds it, or a complete season."""
+        fields = self.fields[doc_no]
+        if fields[_IS_COMPLETE]:
+            return True
+        start, end = fields[_EP_START], fields[_EP_END]
+        return start is not None and start <= episode <= end
+
+    def _posting(self, term):
+        """Posting of a term, or the merged postings of a tuple of alternatives."""
+        if isinstance(term, str):
+            return self.postings.get(term)
+        merged = {}
+        for alternative in term:
+            posting = self.postings.get(alternative)
+            if posting is not None:
+                for doc_no, tf in zip(*posting):
+                    merged[doc_no] = max(tf, merged.get(doc_no, 0))
+        if not merged:
+            return None
+        doc_nos = sorted(merged)
+        return array("I", doc_nos), array("H", (merged[n] for n in doc_nos))
+
+    def match_all(self, terms: list) -> dict:
+        """{doc_no: bm25 score} of docs holding every term (a tuple term matches any of its words)."""
+        if not terms:
+            return dict.fromkeys(range(len(self.fields)), 0.0)
+        postings = []
+        for term in terms:
+            posting = self._posting(term)
+            if posting is None:
+                return {}
+            postings.append(posting)
+        postings.sort(key=lambda p: len(p[0]))
+
+        n_docs = len(self.fields)
+        avg_length = self.total_length / n_docs if n_docs else 1
+        idfs = [math.log(1 + (n_docs - len(p[0]) + 0.5) / (len(p[0]) + 0.5)) for p in postings]
+
+        scores = {}
+        lead_docs, lead_tfs = postings[0]
+        if len(postings) == 1:
+            idf, lengths = idfs[0], self.lengths
+            for doc_no, tf in zip(lead_docs, lead_tfs):
+                norm = K1 * (1 - B + B * lengths[doc_no] / avg_length)
+                scores[doc_no] = idf * tf * (K1 + 1) / (tf + norm)
+            return scores
+        for doc_no, tf in zip(lead_docs, lead_tfs):
+            tfs = [tf]
+            for docs, freqs in postings[1:]:
+                i = bisect_left(docs, doc_no)
+                if i == len(docs) or docs[i] != doc_no:
+                    break
+                tfs.append(freqs[i])
+            else:
+                norm = K1 * (1 - B + B * self.lengths[doc_no] / avg_length)
+                scores[doc_no] = sum(idf * tf * (K1 + 1) / (tf + norm) for idf, tf in zip(idfs, tfs))
+        return scores
+
+    def match_prefixes(self, words: list) -> set:
+        """Doc numbers holding a term starting with every word."""
+        if self._terms is None:
+            self._terms = sorted(self.postings)
+        matched = None
+        for word in sorted(words, key=len, reverse=True):
+            docs = set()
+            i = bisect_left(self._terms, word)
+            while i < len(self._terms) and self._terms[i].startswith(word):
+                docs.update(self.postings[self._terms[i]][0])
+                i += 1
+            matched = docs if matched is None else matched & docs
+            if not matched:
+                return set()
+        return matched or set()
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: postings arrays, term strings, stored fields."""
+        size = sys.getsizeof(self.postings) + sys.getsizeof(self.fields)
+        for term, (docs, freqs) in self.postings.items():
+            size += sys.getsizeof(term) + docs.buffer_info()[1] * 6 + 64 * 2 + 56
+        size += self.lengths.buffer_info()[1] * 2 + len(self.oids)
+        # tuple of 9 slots plus the unshared strings
+        size += len(self.fields) * (40 + 8 * len(DOC_FIELDS)) + self._field_bytes
+        return size
+
+
+class SearchIndex:
+    """
+    In-process BM25 search over every chat's movies.
+
+    Chats are streamed from the collection in the background and served
+    once fully loaded; until then (and for chats that failed to load)
+    searches return None so the caller falls back to Mongo. Saved docs are
+    added as they come in; a chat whose docs are deleted or rewritten is
+    dropped and reloaded.
+    """
+
+    def __init__(self, coll, tokens_of, batch_size: int = 2000):
+        self.coll = coll
+        self.tokens_of = tokens_of
+        self.batch_size = batch_size
+        self.enabled = False
+        self._chats = {}
+        self._loading = {}
+        self._pending = {}
+        self._task = None
+        self.searches = 0
+
+    def ready(self, chat_id: int) -> bool:
+        return self.enabled and chat_id in self._chats
+
+    def start(self):
+        """Enable the index and load every chat with movies in the background."""
+        self.enabled = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._load_all())
+
+    def stop(self):
+        self.enabled = False
+        for task in [self._task, *self._loading.values()]:
+            if task and not task.done():
+                task.cancel()
+        self._chats.clear()
+
+    async def _load_all(self):
+        try:
+            chat_ids = await self.coll.distinct("chat_id")
+        except Exception:
+            logger.exception("Listing chats for the search index failed")
+            return
+        for chat_id in chat_ids:
+            if self.enabled and chat_id not in self._chats:
+                await self.reload(chat_id)
+
+    async def reload(self, chat_id: int, restart: bool = False):
+        """Load a chat; with restart, a load already streaming is started over."""
+        task = self._loading.get(chat_id)
+        if task is not None and restart:
+            task.cancel()
+            task = None
+        if task is None:
+            task = asyncio.ensure_future(self._load(chat_id))
+            self._loading[chat_id] = task
+
+            def _done(t):
+                if self._loading.get(chat_id) is t:
+                    del self._loading[chat_id]
+            task.add_done_callback(_done)
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+
+    async def _load(self, chat_id: int):
+        started = time.monotonic()
+        index = ChatIndex(self.tokens_of)
+        self._pending[chat_id] = []
+        projection = {field: 1 for field in DOC_FIELDS}
+        projection.update(tokens=1, caption=1)
+        try:
+            async for doc in self.coll.find({"chat_id": chat_id}, projection, batch_size=self.batch_size):
+                index.add(doc)
+                if len(index) % self.batch_size == 0:
+                    await asyncio.sleep(0)  # let handlers run between batches
+        except Exception:
+            logger.exception(f"Loading search index of chat {chat_id} failed")
+            self._pending.pop(chat_id, None)
+            return
+
+        # docs saved while streaming may or may not have been seen by the cursor
+        pending = self._pending.pop(chat_id, [])
+        if pending:
+            seen = {doc["_id"].binary for doc in pending}
+            seen.intersection_update(bytes(index.oids[i:i + 12]) for i in range(0, len(index.oids), 12))
+            for doc in pending:
+                if doc["_id"].binary not in seen:
+                    index.add(doc)
+
+        if self.enabled:
+            self._chats[chat_id] = index
+        logger.info(
+            f"📚 Search index for chat {chat_id}: {len(index)} docs, {len(index.postings)} terms "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+    async def apply(self, chat_id: int, docs: list = None):
+        """Chat change hook: add saved docs, reload the chat on anything else."""
+        if not self.enabled:
+            return
+        index = self._chats.get(chat_id)
+        if docs is None or index is None:
+            # deletes can't be applied in place; unknown chats are streamed in
+            if docs is None:
+                self._chats.pop(chat_id, None)
+            if docs is None or chat_id not in self._loading:
+                asyncio.create_task(self.reload(chat_id, restart=docs is None))
+            elif chat_id in self._pending:
+                self._pending[chat_id].extend(doc for doc in docs if "_id" in doc)
+            return
+        for doc in docs:
+            if "_id" in doc:
+                index.add(doc)
+
+    def search(self, chat_id: int, terms: list, skip: int, limit: int, after: list = None,
+               prefixes: list = None, episode: int = None):
+        """
+        (results, total, has_more) for docs holding every term, or None
+        when the chat is not loaded. With `prefixes`, docs must also hold a
+        term starting with each of them and results are not scored; with
+        `episode`, they must contain that episode (see has_episode).
+        Results look like Mongo's, cursors included.
+        """
+        index = self._chats.get(chat_id) if self.enabled else None
+        if index is None:
+            return None
+        self.searches += 1
+
+        prefix = bool(prefixes)
+        if prefix:
+            matched = index.match_prefixes(prefixes)
+            if terms and matched:
+                matched = matched.intersection(index.match_all(terms))
+            candidates = [(0, n) for n in matched]
+        else:
+            candidates = [(-score, n) for n, score in index.match_all(terms).items()]
+        if episode is not None:
+            candidates = [c for c in candidates if index.has_episode(c[1], episode)]
+        total = len(candidates)
+        if after:
+            score, season_num, ep_start, ep_end, doc_id = after
+            neg = 0 if prefix else -(score or 0)
+            tie = (sort_value(season_num), sort_value(ep_start), sort_value(ep_end), ObjectId(doc_id).binary)
+            candidates = [c for c in candidates if c[0] > neg or (c[0] == neg and index.tie_key(c[1]) > tie)]
+            skip = 0
+
+        # only docs scoring at least the page's last score need their tie keys
+        wanted = skip + limit + 1
+        if len(candidates) > wanted:
+            last = heapq.nsmallest(wanted, (c[0] for c in candidates))[-1]
+            candidates = [c for c in candidates if c[0] <= last]
+        page = sorted((neg, index.tie_key(n), n) for neg, n in candidates)[skip:wanted]
+        results = [index.to_doc(n, None if prefix else -neg) for neg, _, n in page[:limit]]
+        return results, total, len(page) > limit
+
+    def stats(self) -> dict:
+        chats = {chat_id: (len(index), index.memory_bytes()) for chat_id, index in self._chats.items()}
+        return {
+            "enabled": self.enabled,
+            "chats": chats,
+            "loading": len(self._loading),
+            "docs": sum(docs for docs, _ in chats.values()),
+            "bytes": sum(size for _, size in chats.values()),
+            "searches": self.searches,
+        }
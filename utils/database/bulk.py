@@ -0,0 +1,134 @@
+import time
+import asyncio
+import logging
+from pymongo.errors import BulkWriteError
+from info import WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL
+from .database import collection, notify_chat_change
+
+logger = logging.getLogger(__name__)
+
+
+class MovieBatchWriter:
+    """
+    Buffer movie documents and write them with unordered insert_many.
+
+    Duplicates are rejected by the unique_file_per_chat index, so a batch
+    costs one round trip no matter how many files in it already exist.
+    Flushes when `batch_size` docs are pending or `flush_interval` seconds
+    passed since the last flush. Use as `async with MovieBatchWriter() as w:`
+    so the tail of the batch is flushed on exit. `on_flush(tags)` is called
+    with the tags passed to add() once Mongo has answered for their
+    documents (saved or rejected as duplicates), e.g. to checkpoint message
+    ids; tags of docs that failed to write are never reported.
+    """
+
+    def __init__(self, batch_size: int = WRITE_BATCH_SIZE,
+                 flush_interval: float = WRITE_FLUSH_INTERVAL, coll=None,
+                 on_flush=None):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.coll = coll if coll is not None else collection
+        self.on_flush = on_flush
+
+        self.saved = 0
+        self.duplicates = 0
+        self.errors = 0
+
+        self._pending = []
+        self._tags = []
+        self._lock = asyncio.Lock()
+        self._last_flush = time.monotonic()
+        self._ticker = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def __aenter__(self):
+        if self.flush_interval and self.flush_interval > 0:
+            self._ticker = asyncio.create_task(self._tick())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._ticker:
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+            self._ticker = None
+        await self.flush()
+
+    async def _tick(self):
+        """Flush a half-filled batch once it has waited long enough."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+                await self.flush()
+
+    async def add(self, doc: dict, tag=None):
+        """Queue one document built by build_movie_doc (None counts as an error)."""
+        if not doc:
+            self.errors += 1
+            if self.on_flush and tag is not None:
+                self.on_flush([tag])
+            return
+
+        self._pending.append(doc)
+        self._tags.append(tag)
+        if (
+            len(self._pending) >= self.batch_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self):
+        """Write every pending document and update the counters."""
+        async with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+
+            docs, self._pending = self._pending, []
+            tags, self._tags = self._tags, []
+            saved_before = self.saved
+            failed = set()
+            lost = set()
+            try:
+                res = await self.coll.insert_many(docs, ordered=False)
+                self.saved += len(res.inserted_ids)
+            except BulkWriteError as bwe:
+                details = bwe.details or {}
+                write_errors = details.get("writeErrors", [])
+                failed = {err.get("index") for err in write_errors}
+                dupes = sum(1 for err in write_errors if err.get("code") == 11000)
+                self.saved += details.get("nInserted", 0)
+                self.duplicates += dupes
+                self.errors += len(write_errors) - dupes
+                lost = {err.get("index") for err in write_errors if err.get("code") != 11000}
+                if len(write_errors) > dupes:
+                    logger.warning(
+                        f"⚠️ Batch write: {len(write_errors) - dupes} docs failed "
+                        f"({write_errors[0].get('errmsg')})"
+                    )
+            except Exception:
+                # Tags are not reported, so a checkpoint never moves past these docs.
+                self.errors += len(docs)
+                logger.exception(f"❌ Batch write of {len(docs)} docs failed")
+                return
+
+            if self.saved > saved_before:
+                by_chat = {}
+                # hooks only see docs that were actually stored
+                for i, doc in enumerate(docs):
+                    if i in failed:
+                        continue
+                    by_chat.setdefault(doc["chat_id"], []).append(doc)
+                for chat_id, chat_docs in by_chat.items():
+                    await notify_chat_change(chat_id, chat_docs)
+            if self.on_flush:
+                self.on_flush([t for i, t in enumerate(tags) if t is not None and i not in lost])
+            logger.info(
+                f"💾 Flushed {len(docs)} docs → saved={self.saved} "
+                f"dupes={self.duplicates} errors={self.errors}"
+            )
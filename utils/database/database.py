@@ -1,11 +1,23 @@
 import os
 import math
+import time
 import re
+import heapq
+import asyncio
 import logging
+from collections import deque
+from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import TEXT
+from pymongo import TEXT, UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from bson import ObjectId
-from info import MONGO_URL, COLLECTION_NAME, DB_NAME
+from info import (
+    MONGO_URL, COLLECTION_NAME, DB_NAME, LINK_WATCH, SEARCH_COUNT_MODE, SEARCH_COUNT_CAP,
+    BM25_SEARCH, SLOW_QUERY_MS, SHARED_STORAGE, PARSE_CACHE_TTL_DAYS
+)
+from utils.query import tokenize, normalize_query, parse_query
+from .links import LinkMap
+from .bm25 import SearchIndex, sort_value
 
 logger = logging.getLogger(__name__)
 
@@ -14,47 +26,90 @@ db = client[DB_NAME]
 collection = db[COLLECTION_NAME]
 INDEXED_COLL = db["indexed_chats"]
 RESTART_COLL = db["restart_info"]
+PARSE_CACHE_COLL = db["caption_parse_cache"]
+JOBS_COLL = db["index_jobs"]
+
+LINKS = LinkMap(INDEXED_COLL)
+
+# Async callbacks run as hook(chat_id, docs) after that chat's movies
+# change, e.g. to invalidate cached searches. docs holds the saved docs
+# for saves and is None for deletes and other bulk changes.
+CHAT_CHANGE_HOOKS = []
+
+
+def on_chat_change(func):
+    """Register a chat change hook (usable as a decorator)."""
+    CHAT_CHANGE_HOOKS.append(func)
+    return func
+
+
+async def notify_chat_change(chat_id: int, docs: list = None):
+    for hook in CHAT_CHANGE_HOOKS:
+        try:
+            await hook(int(chat_id), docs)
+        except Exception as e:
+            logger.warning(f"⚠️ Chat change hook {hook.__name__} failed for {chat_id}: {e}")
 
 
 
 async def drop_existing_indexes():
-    """Drop all existing indexes safely."""
+    """
+    Drop all existing indexes safely, except unique ones: saves rely on
+    unique_file_per_chat instead of checking for duplicates first.
+    """
     try:
         existing = await collection.index_information()
-        for name in list(existing.keys()):
-            if name != "_id_":
+        for name, info in existing.items():
+            if name != "_id_" and not info.get("unique"):
                 await collection.drop_index(name)
 
         existing_idx = await INDEXED_COLL.index_information()
-        for name in list(existing_idx.keys()):
-            if name != "_id_":
+        for name, info in existing_idx.items():
+            if name != "_id_" and not info.get("unique"):
                 await INDEXED_COLL.drop_index(name)
 
-        logger.info("🧹 Dropped all old indexes successfully")
+        logger.info("🧹 Dropped all old non-unique indexes successfully")
     except Exception as e:
         logger.exception(f"Failed to drop indexes: {e}")
 
 
+# Every search is scoped by chat, so every movie index starts with chat_id:
+# text search, tokens $all / prefix ranges, and field predicates sorted like
+# search results (season_num, ep_start, ep_end, _id) with the episode range
+# bounds in the same index. Other chat_id-only lookups use any of them.
+MOVIE_INDEXES = [
+    ([("chat_id", 1), ("title", TEXT), ("caption", TEXT), ("codec", TEXT)],
+     {"name": "movie_text_index", "default_language": "english",
+      "weights": {"title": 5, "caption": 1, "codec": 2}}),
+    ([("chat_id", 1), ("tokens", 1)], {"name": "chat_tokens"}),
+    ([("chat_id", 1), ("season_num", 1), ("ep_start", 1), ("ep_end", 1), ("_id", 1)],
+     {"name": "chat_episode_range"}),
+    ([("chat_id", 1), ("file_unique_id", 1)], {"name": "unique_file_per_chat", "unique": True}),
+]
+# Indexes of older versions: single-field ones without the chat prefix and
+# the mixed-type (season, episode) sort index
+LEGACY_INDEXES = ["chat_id_1", "quality_1", "lang_1", "print_1", "season_1", "episode_1", "codec_1",
+                  "chat_season_episode"]
+
+
 async def ensure_indexes():
-    """Ensure indexes exist with correct definitions."""
+    """Ensure indexes exist with correct definitions, dropping legacy ones."""
     try:
-        await collection.create_index(
-            [("title", TEXT), ("caption", TEXT), ("codec", TEXT)],
-            name="movie_text_index",
-            default_language="english",
-            background=True,
-            weights={"title": 5, "caption": 1, "codec": 2},
-        )
+        existing = await collection.index_information()
+        for name in LEGACY_INDEXES:
+            if name in existing:
+                await collection.drop_index(name)
+                logger.info(f"🧹 Dropped legacy index {name}")
 
-        for field in ["chat_id", "quality", "lang", "print", "season", "episode", "codec"]:
-            await collection.create_index(field, background=True)
+        # the text index used to be collection-wide; until the chat-prefixed
+        # one is built, $text fails and searches fall back to tokens
+        text_index = existing.get("movie_text_index")
+        if text_index and text_index["key"][0][0] != "chat_id":
+            await collection.drop_index("movie_text_index")
+            logger.info("🧹 Dropped collection-wide text index, rebuilding it per chat")
 
-        await collection.create_index(
-            [("chat_id", 1), ("file_unique_id", 1)],
-            unique=True,
-            background=True,
-            name="unique_file_per_chat"
-        )
+        for keys, options in MOVIE_INDEXES:
+            await collection.create_index(keys, background=True, **options)
 
         await INDEXED_COLL.create_index("target_chat", background=True)
         await INDEXED_COLL.create_index("source_chat", background=True)
@@ -64,11 +119,29 @@ async def ensure_indexes():
             background=True
         )
 
+        await JOBS_COLL.create_index("status", background=True)
+        await ensure_parse_cache_ttl()
+
         logger.info("✅ Indexes ensured successfully")
     except Exception:
         logger.exception("Failed to create indexes")
 
 
+async def ensure_parse_cache_ttl():
+    """Expire persisted caption parses PARSE_CACHE_TTL_DAYS after they were stored."""
+    ttl = PARSE_CACHE_TTL_DAYS * 86400
+    existing = (await PARSE_CACHE_COLL.index_information()).get("parse_cache_ttl")
+    if existing and existing.get("expireAfterSeconds") != ttl:
+        await db.command("collMod", PARSE_CACHE_COLL.name,
+                         index={"name": "parse_cache_ttl", "expireAfterSeconds": ttl})
+    elif not existing:
+        await PARSE_CACHE_COLL.create_index("created_at", name="parse_cache_ttl",
+                                            expireAfterSeconds=ttl, background=True)
+    # entries stored before the TTL existed start their countdown now
+    await PARSE_CACHE_COLL.update_many({"created_at": {"$exists": False}},
+                                       {"$currentDate": {"created_at": True}})
+
+
 async def rebuild_indexes():
     """Drop and recreate all indexes (clean rebuild)."""
     try:
@@ -97,6 +170,85 @@ def _safe_int(value):
         return None
 
 
+def episode_fields(season, episode) -> dict:
+    """
+    Numeric companions of season/episode, which hold ints or strings like
+    "1-10" and "Complete": season_num, ep_start, ep_end (a single episode
+    is a range of one) and is_complete.
+    """
+    def numbers(value):
+        if isinstance(value, int):
+            return [value]
+        return [int(n) for n in re.findall(r"\d+", str(value or ""))]
+
+    seasons, episodes = numbers(season), numbers(episode)
+    return {
+        "season_num": seasons[0] if seasons else None,
+        "ep_start": min(episodes) if episodes else None,
+        "ep_end": max(episodes) if episodes else None,
+        "is_complete": isinstance(episode, str) and "complete" in episode.lower(),
+    }
+
+
+def build_tokens(doc: dict) -> list:
+    """
+    Search tokens of a movie doc: words of title, year, quality, lang,
+    print, codec and caption, plus s02 / e05 / s02e05 markers.
+    """
+    tokens = set()
+    for field in ("title", "year", "quality", "lang", "print", "codec", "caption"):
+        tokens.update(tokenize(doc.get(field)))
+
+    season, episode = doc.get("season"), doc.get("episode")
+    if isinstance(season, int):
+        tokens.add(f"s{season:02d}")
+    if isinstance(episode, int):
+        tokens.add(f"e{episode:02d}")
+        if isinstance(season, int):
+            tokens.add(f"s{season:02d}e{episode:02d}")
+    elif episode is not None:
+        tokens.update(tokenize(episode))
+    return sorted(tokens)
+
+
+# In-process BM25 index, served by get_movies_async when BM25_SEARCH is on
+SEARCH_INDEX = SearchIndex(collection, build_tokens)
+
+
+@on_chat_change
+async def update_search_index(chat_id: int, docs: list = None):
+    await SEARCH_INDEX.apply(chat_id, docs)
+
+
+def build_movie_doc(chat_id: int, title: str = None, year: int = None,
+                    quality: str = None, lang: str = None, print_type: str = None,
+                    season=None, episode=None, codec: str = None,
+                    caption: str = None, link: str = None,
+                    file_unique_id: str = None):
+    """Build the stored document for one file, or None if it can't be keyed."""
+    if not file_unique_id:
+        return None
+
+    doc = {
+        "chat_id": int(chat_id),
+        "file_unique_id": file_unique_id,
+        "title": title.strip() if title else None,
+        "year": int(year) if year else None,
+        "quality": quality,
+        "lang": lang,
+        "print": print_type,
+        "season": _safe_int(season),
+        "episode": _safe_int(episode),
+        "codec": codec.strip() if codec else None,
+        "caption": caption,
+        "link": link,
+    }
+    doc.update(episode_fields(doc["season"], doc["episode"]))
+    doc = {k: v for k, v in doc.items() if v is not None}
+    doc["tokens"] = build_tokens(doc)
+    return doc
+
+
 async def save_movie_async(chat_id: int, title: str = None, year: int = None,
                            quality: str = None, lang: str = None, print_type: str = None,
                            season=None, episode=None, codec: str = None,
@@ -104,38 +256,24 @@ async def save_movie_async(chat_id: int, title: str = None, year: int = None,
                            file_unique_id: str = None):
 
     try:
-        if not file_unique_id:
+        doc = build_movie_doc(
+            chat_id, title=title, year=year, quality=quality, lang=lang,
+            print_type=print_type, season=season, episode=episode, codec=codec,
+            caption=caption, link=link, file_unique_id=file_unique_id
+        )
+        if not doc:
             logger.warning("⚠️ Skipped: Missing file_unique_id.")
             return "error"
 
-        existing = await collection.find_one({
-            "chat_id": int(chat_id),
-            "file_unique_id": file_unique_id
-        })
-        if existing:
-            logger.info(f"⏩ Duplicate skipped ({file_unique_id}) in chat {chat_id}")
-            return "duplicate"
-
-        doc = {
-            "chat_id": int(chat_id),
-            "file_unique_id": file_unique_id,
-            "title": title.strip() if title else None,
-            "year": int(year) if year else None,
-            "quality": quality,
-            "lang": lang,
-            "print": print_type,
-            "season": _safe_int(season),
-            "episode": _safe_int(episode),
-            "codec": codec.strip() if codec else None,
-            "caption": caption,
-            "link": link,
-        }
-
-        clean_doc = {k: v for k, v in doc.items() if v is not None}
-        await collection.insert_one(clean_doc)
+        # unique_file_per_chat rejects duplicates, no need for a find_one first
+        await collection.insert_one(doc)
         logger.info(f"✅ Saved: {title or 'Untitled'} ({chat_id})")
+        await notify_chat_change(chat_id, [doc])
         return "saved"
 
+    except DuplicateKeyError:
+        logger.info(f"⏩ Duplicate skipped ({file_unique_id}) in chat {chat_id}")
+        return "duplicate"
     except Exception as e:
         if "duplicate key error" in str(e).lower():
             logger.info(f"⚠️ Duplicate prevented for {file_unique_id}")
@@ -155,92 +293,680 @@ async def delete_chat_data_async(chat_id: int):
 
         res = await collection.delete_many(query)
         logger.info(f"🗑️ Deleted {res.deleted_count}/{count} docs for chat {chat_id}")
+        await notify_chat_change(chat_id)
         return res.deleted_count
     except Exception as e:
         logger.exception(f"❌ delete_chat_data_async failed: {e}")
         return 0
 
-async def get_movies_async(chat_id: int, query: str, page: int = 1, limit: int = 100):
-    """Full-text + regex hybrid search."""
-    if not query or not query.strip():
-        return {"results": [], "total": 0, "page": 1, "pages": 1}
+SEARCH_PROJECTION = {
+    "title": 1, "year": 1, "quality": 1, "lang": 1,
+    "print": 1, "codec": 1, "season": 1, "episode": 1,
+    "season_num": 1, "ep_start": 1, "ep_end": 1,
+    "caption": 1, "link": 1
+}
+
+
+def _token_hints(parsed: dict) -> list:
+    """Tokens every doc matching the query's field predicates holds (see build_tokens)."""
+    hints = []
+    # episodes are a range predicate (packs hold no eNN token), seasons a token
+    if parsed["season"] is not None:
+        hints.append(f"s{parsed['season']:02d}")
+    if parsed["year"] is not None:
+        hints.append(str(parsed["year"]))
+    if parsed["quality"] and len(parsed["quality"]) == 1:
+        hints.append(parsed["quality"][0].lower())
+    if parsed["codec"]:
+        hints.append(parsed["codec"].lower())
+    return hints
+
+
+def _field_filter(chat_id: int, parsed: dict, words: list = ()) -> dict:
+    """
+    Equality predicates for the structured parts of a parsed query. Their
+    tokens are required too, so the (chat_id, tokens) index scans only
+    candidate docs even when no free words are left.
+    """
+    match = {"chat_id": int(chat_id)}
+    if parsed["season"] is not None:
+        match["season_num"] = parsed["season"]
+    if parsed["episode"] is not None:
+        # the episode itself, or a pack whose range holds it, or a complete season
+        episode = parsed["episode"]
+        match["$or"] = [
+            {"ep_start": {"$lte": episode}, "ep_end": {"$gte": episode}},
+            {"is_complete": True},
+        ]
+    for field in ("year", "codec"):
+        if parsed[field] is not None:
+            match[field] = parsed[field]
+    if parsed["quality"]:
+        quality = parsed["quality"]
+        match["quality"] = quality[0] if len(quality) == 1 else {"$in": quality}
+    # free words first, the first $all value bounds the index scan
+    tokens = list(words) + _token_hints(parsed)
+    if tokens:
+        match["tokens"] = {"$all": tokens}
+    if parsed["langs"]:
+        # lang is a display string ("[English, Hindi]"), its words live in tokens
+        match["$and"] = [{"tokens": {"$in": spellings}} for spellings in parsed["langs"]]
+    return match
+
+
+def _search_filters(chat_id: int, query: str):
+    """
+    (token filter, text filter) for a query, or None if it has no words.
+
+    Season/episode, resolution, year, codec and language words become
+    field predicates; only the remaining words go to tokens and $text.
+    The text filter is None when no free words remain.
+    """
+    query = normalize_query(query)
+    if not query:
+        return None
+    parsed = parse_query(query)
+    words = parsed["words"]
+    # tokens $all replaces the old per-word regex $or; (chat_id, tokens) serves it
+    token_filter = _field_filter(chat_id, parsed, words)
+    if not words:
+        return token_filter, None
+    return token_filter, dict(token_filter, **{"$text": {"$search": " ".join(words)}})
+
+
+def search_cursor(doc: dict) -> list:
+    """Keyset cursor (score, season_num, ep_start, ep_end, _id) of a search result."""
+    return [doc.get("score"), doc.get("season_num"), doc.get("ep_start"), doc.get("ep_end"), str(doc["_id"])]
+
+
+def _after_cursor(cursor: list, text: bool) -> dict:
+    """$expr matching docs sorted after `cursor` (score desc, then season_num, ep_start, ep_end, _id asc)."""
+    score, season, ep_start, ep_end, doc_id = cursor
+    keys = [("$season_num", season, "$gt"), ("$ep_start", ep_start, "$gt"), ("$ep_end", ep_end, "$gt")]
+    if text:
+        keys.insert(0, ("$score", score, "$lt"))
+
+    expr = {"$gt": ["$_id", ObjectId(doc_id)]}
+    for field, value, op in reversed(keys):
+        # missing fields sort as null, compare them the same way
+        field = {"$ifNull": [field, None]}
+        expr = {"$or": [{op: [field, value]}, {"$and": [{"$eq": [field, value]}, expr]}]}
+    return {"$expr": expr}
+
 
-    query = query.strip()
-    words = [w for w in re.split(r"\s+", query) if w]
+def _next_prefix(word: str) -> str:
+    return word[:-1] + chr(ord(word[-1]) + 1)
+
+
+def _prefix_filter(chat_id: int, query: str):
+    """
+    Docs with a token starting with every free query word ("aveng" -> avengers),
+    plus the query's field predicates.
+
+    Each word is a [word, next prefix) range on the multikey
+    (chat_id, tokens) index, so partial words need no regex scan.
+    """
+    query = normalize_query(query)
+    if not query:
+        return None
+    parsed = parse_query(query)
+    match = _field_filter(chat_id, parsed)
+    # longest (most selective) word first, its range drives the index scan
+    words = sorted(parsed["words"], key=len, reverse=True)
+    ranges = [{"tokens": {"$elemMatch": {"$gte": w, "$lt": _next_prefix(w)}}} for w in words]
+    if ranges:
+        match["$and"] = ranges + match.get("$and", [])
+    return match
+
+
+# Recent searches slower than SLOW_QUERY_MS, newest last, for /indexadvisor
+SLOW_QUERIES = deque(maxlen=200)
+
+
+def query_shape(match: dict) -> str:
+    """Fields and operators of a filter without its values, e.g. "chat_id season tokens:$all"."""
+    parts = []
+    for key, value in match.items():
+        if key in ("$and", "$or"):
+            parts.extend(query_shape(sub) for sub in value)
+        elif isinstance(value, dict) and value and all(op.startswith("$") for op in value):
+            parts.append(f"{key}:{','.join(sorted(value))}")
+        else:
+            parts.append(key)
+    return " ".join(sorted(parts))
+
+
+async def _search_page(match: dict, text: bool, skip: int, limit: int, count_mode: str, after: list = None):
+    """
+    A page of results and the total, fetched concurrently.
+
+    The page sorts and limits in adjacent stages, so the server keeps a
+    top-k of skip + limit docs instead of sorting every match. count_mode
+    "exact" counts every match, "capped" stops counting at
+    SEARCH_COUNT_CAP and "none" skips counting (total is None). With
+    `after`, the page starts behind that cursor instead of skipping.
+    Returns (results, total, capped, has_more).
+    """
+    pipeline = [{"$match": match}]
+    if text:
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+    if after:
+        pipeline.append({"$match": _after_cursor(after, text)})
+        skip = 0
+    sort = {"score": -1} if text else {}
+    sort.update({"season_num": 1, "ep_start": 1, "ep_end": 1, "_id": 1})
+    projection = dict(SEARCH_PROJECTION, score=1) if text else SEARCH_PROJECTION
+    pipeline += [{"$sort": sort}, {"$skip": skip}, {"$limit": limit + 1}, {"$project": projection}]
+
+    async def count():
+        if count_mode == "exact":
+            return await collection.count_documents(match)
+        if count_mode == "capped":
+            return await collection.count_documents(match, limit=SEARCH_COUNT_CAP + 1)
+        return None
+
+    started = time.perf_counter()
+    results, total = await asyncio.gather(
+        collection.aggregate(pipeline).to_list(length=limit + 1), count(), return_exceptions=True
+    )
+    # e.g. $text without a text index fails both, the caller falls back
+    for outcome in (results, total):
+        if isinstance(outcome, Exception):
+            raise outcome
+    elapsed = (time.perf_counter() - started) * 1000
+    if elapsed >= SLOW_QUERY_MS:
+        SLOW_QUERIES.append({"at": time.time(), "ms": elapsed, "shape": query_shape(pipeline[0]["$match"]),
+                             "pipeline": pipeline})
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    if total is None:
+        return results, None, False, has_more
+    capped = count_mode == "capped" and total > SEARCH_COUNT_CAP
+    return results, min(total, SEARCH_COUNT_CAP) if capped else total, capped, has_more
+
+
+def _memory_terms(parsed: dict) -> list:
+    """SEARCH_INDEX terms for the structured parts of a parsed query."""
+    terms = _token_hints(parsed)
+    if parsed["quality"] and len(parsed["quality"]) > 1:
+        terms.append(tuple(q.lower() for q in parsed["quality"]))
+    terms.extend(tuple(spellings) for spellings in parsed["langs"])
+    return terms
+
+
+def _search_memory(chat_id: int, query: str, page: int, limit: int, after: list, match: str,
+                   fallback: bool = True):
+    """_get_movies_one served by SEARCH_INDEX, or None when it doesn't hold the chat."""
+    if not BM25_SEARCH or not SEARCH_INDEX.ready(int(chat_id)):
+        return None
+    parsed = parse_query(query)
+    terms, words = _memory_terms(parsed), parsed["words"]
     skip = (page - 1) * limit
+    started = time.perf_counter()
+    found = None
+    if match.endswith("prefix"):
+        match = "bm25_prefix"
+    else:
+        match = "bm25"
+        found = SEARCH_INDEX.search(int(chat_id), terms + words, skip, limit, after,
+                                    episode=parsed["episode"])
+        if found is not None and not found[0] and not after and page == 1 and words and fallback:
+            match = "bm25_prefix"
+    if match == "bm25_prefix":
+        found = SEARCH_INDEX.search(int(chat_id), terms, skip, limit, after, prefixes=words,
+                                    episode=parsed["episode"])
+    if found is None:
+        return None
 
-    text_filter = {"chat_id": int(chat_id), "$text": {"$search": query}}
-    regex_filters = []
-
-    for w in words:
-        # ✅ ONLY CHANGE IS HERE
-        safe = rf"\b{re.escape(w)}\b"
-
-        regex_filters.append({
-            "$or": [
-                {"title": {"$regex": safe, "$options": "i"}},
-                {"quality": {"$regex": safe, "$options": "i"}},
-                {"lang": {"$regex": safe, "$options": "i"}},
-                {"print": {"$regex": safe, "$options": "i"}},
-                {"caption": {"$regex": safe, "$options": "i"}},
-                {"codec": {"$regex": safe, "$options": "i"}},
-                {"season": {"$regex": safe, "$options": "i"}},
-                {"episode": {"$regex": safe, "$options": "i"}},
-            ]
-        })
-
-    final_filter = {"$and": [text_filter] + regex_filters} if regex_filters else text_filter
-    projection = {
-        "score": {"$meta": "textScore"},
-        "title": 1, "year": 1, "quality": 1, "lang": 1,
-        "print": 1, "codec": 1, "season": 1, "episode": 1,
-        "caption": 1, "link": 1
+    results, total, has_more = found
+    logger.info(
+        f"📚 Found {len(results)}/{total} results for '{query}' in chat {chat_id} "
+        f"from memory{' (prefix)' if match == 'bm25_prefix' else ''} "
+        f"in {(time.perf_counter() - started) * 1000:.1f}ms"
+    )
+    return {
+        "results": results, "total": total, "capped": False, "has_more": has_more,
+        "page": page, "pages": math.ceil(total / limit) or 1, "match": match
     }
 
-    try:
-        cursor = (
-            collection.find(final_filter, projection)
-            .sort([
-                ("score", {"$meta": "textScore"}),
-                ("season", 1),
-                ("episode", 1)
-            ])
-            .skip(skip)
-            .limit(limit)
+
+async def _get_movies_one(chat_id: int, query: str, page: int, limit: int,
+                          count_mode: str, after: list, match: str, fallback: bool = True,
+                          memory: bool = True):
+    """
+    get_movies_async over the docs stored under one chat_id; fallback=False
+    skips the prefix retry and memory=False skips SEARCH_INDEX.
+    """
+    empty = {"results": [], "total": 0, "capped": False, "has_more": False,
+             "page": 1, "pages": 1, "match": match}
+    if not query or not query.strip():
+        return empty
+
+    query = normalize_query(query)
+    filters = _search_filters(chat_id, query)
+    if not filters:
+        return empty
+    token_filter, final_filter = filters
+    skip = (page - 1) * limit
+
+    if memory and (match.startswith("bm25") or not after):
+        data = _search_memory(chat_id, query, page, limit, after, match, fallback)
+        if data is not None:
+            return data
+    if match.startswith("bm25"):
+        # index dropped mid-pagination, its cursors mean nothing to Mongo
+        match = "prefix" if match == "bm25_prefix" else "text"
+        after = None
+    if after:
+        count_mode = "none"
+
+    results = None
+    if match != "prefix":
+        # a cursor without a score was issued by the token-only fallback
+        if final_filter is not None and (not after or after[0] is not None):
+            try:
+                results, total, capped, has_more = await _search_page(
+                    final_filter, True, skip, limit, count_mode, after
+                )
+            except Exception as e:
+                logger.exception(f"⚠️ Text search failed ({e}), fallback to tokens")
+        if results is None:
+            results, total, capped, has_more = await _search_page(
+                token_filter, False, skip, limit, count_mode, after
+            )
+        if not results and not after and page == 1 and final_filter is not None and fallback:
+            match = "prefix"
+
+    if match == "prefix":
+        results, total, capped, has_more = await _search_page(
+            _prefix_filter(chat_id, query), False, skip, limit, count_mode, after
         )
-        results = await cursor.to_list(length=limit)
-        total = await collection.count_documents(final_filter)
+
+    if total is None:
+        pages = page + 1 if has_more else page
+    else:
         pages = math.ceil(total / limit) or 1
-        logger.info(f"🔍 Found {len(results)}/{total} results for '{query}' in chat {chat_id}")
-        return {"results": results, "total": total, "page": page, "pages": pages}
+    logger.info(
+        f"🔍 Found {len(results)}/{total}{'+' if capped else ''} results for '{query}' "
+        f"in chat {chat_id}{' (prefix)' if match == 'prefix' else ''}"
+    )
+    return {
+        "results": results, "total": total, "capped": capped,
+        "has_more": has_more, "page": page, "pages": pages, "match": match
+    }
 
-    except Exception as e:
-        logger.exception(f"⚠️ Text search failed ({e}), fallback to regex")
-        fallback_filter = {"chat_id": int(chat_id), "$and": regex_filters}
-        cursor = (
-            collection.find(fallback_filter)
-            .sort([("season", 1), ("episode", 1)])
-            .skip(skip)
-            .limit(limit)
-        )
-        results = await cursor.to_list(length=limit)
-        total = await collection.count_documents(fallback_filter)
+
+def result_key(doc: dict) -> tuple:
+    """Sort key of a search result, the search order as one tuple (see search_cursor)."""
+    score, season_num, ep_start, ep_end, doc_id = search_cursor(doc)
+    return (-(score or 0), sort_value(season_num), sort_value(ep_start), sort_value(ep_end), ObjectId(doc_id).binary)
+
+
+async def _fan_out(chats: list, query: str, page: int, limit: int, count_mode: str,
+                   after: list, match: str, memory: bool) -> list:
+    """Every source's part of a get_movies_async page, for it to merge."""
+    # skip can't be split across sources; without a cursor each returns the first page * limit
+    want = limit if after else page * limit
+    source_page = page if after else 1
+    return await asyncio.gather(*(
+        _get_movies_one(chat, query, source_page, want, count_mode, after, match,
+                        fallback=False, memory=memory)
+        for chat in chats
+    ))
+
+
+async def get_movies_async(chat_id: int, query: str, page: int = 1, limit: int = 100,
+                           count_mode: str = SEARCH_COUNT_MODE, after: list = None,
+                           match: str = "text"):
+    """
+    Full-text search narrowed to docs holding every query token, falling
+    back to token prefixes when that finds nothing. Structured words
+    (s02e05, 720p, 2019, x264, hindi) filter their fields instead, see
+    _search_filters.
+
+    Pass the search_cursor of the previous page's last result as `after`
+    to page by keyset instead of skip; totals are only counted without it.
+    The returned "match" ("text" or "prefix", "bm25" or "bm25_prefix" when
+    served by SEARCH_INDEX) must be passed back as `match` with those cursors.
+
+    With SHARED_STORAGE, docs live under their source chats: every linked
+    source is searched with the same cursor and the pages are merged in
+    search order. BM25 and text scores don't compare, so all sources are
+    served from SEARCH_INDEX or all from Mongo.
+    """
+    chats = await storage_chats_async(chat_id)
+    if len(chats) == 1:
+        return await _get_movies_one(chats[0], query, page, limit, count_mode, after, match)
+    if not chats:
+        return {"results": [], "total": 0, "capped": False, "has_more": False,
+                "page": 1, "pages": 1, "match": match}
+
+    memory = BM25_SEARCH and all(SEARCH_INDEX.ready(chat) for chat in chats)
+    while True:
+        if match.startswith("bm25") and not memory:
+            # a source's index dropped mid-pagination, its cursors mean nothing to Mongo
+            match = "prefix" if match == "bm25_prefix" else "text"
+            after = None
+        parts = await _fan_out(chats, query, page, limit, count_mode, after, match, memory)
+        if not after and page == 1 and not any(part["results"] for part in parts) and not match.endswith("prefix"):
+            parts = await _fan_out(chats, query, page, limit, count_mode, after, "prefix", memory)
+        if not memory or all(part["match"].startswith("bm25") for part in parts):
+            break
+        # an index dropped while searching, don't mix Mongo scores into BM25 ones
+        memory = False
+
+    merged = list(heapq.merge(*(part["results"] for part in parts), key=result_key))
+    skip = 0 if after else (page - 1) * limit
+    results = merged[skip:skip + limit]
+    has_more = len(merged) > skip + limit or any(part["has_more"] for part in parts)
+
+    totals = [part["total"] for part in parts]
+    total = None if None in totals else sum(totals)
+    capped = any(part["capped"] for part in parts)
+    if total is None:
+        pages = page + 1 if has_more else page
+    else:
         pages = math.ceil(total / limit) or 1
-        return {"results": results, "total": total, "page": page, "pages": pages}
+    prefix = parts[0]["match"].endswith("prefix")
+    if all(part["match"].startswith("bm25") for part in parts):
+        match = "bm25_prefix" if prefix else "bm25"
+    else:
+        match = "prefix" if prefix else "text"
+    return {
+        "results": results, "total": total, "capped": capped,
+        "has_more": has_more, "page": page, "pages": pages, "match": match
+    }
+
 
-async def mark_indexed_chat_async(target_chat: int, source_chat: int):
-    """Link one target chat with one source."""
+async def count_movies_async(chat_id: int, query: str, match: str = "text") -> int:
+    """Exact number of matches for a query (for filling in capped totals later)."""
+    counts = await asyncio.gather(*(
+        _count_movies_one(chat, query, match) for chat in await storage_chats_async(chat_id)
+    ))
+    return sum(counts)
+
+
+async def _count_movies_one(chat_id: int, query: str, match: str) -> int:
+    filters = _search_filters(chat_id, query or "")
+    if not filters:
+        return 0
+    if match.startswith("bm25"):
+        data = _search_memory(chat_id, normalize_query(query), 1, 1, None, match)
+        if data is not None:
+            return data["total"]
+        match = "prefix" if match == "bm25_prefix" else "text"
+    if match == "prefix":
+        return await collection.count_documents(_prefix_filter(chat_id, query))
+    if filters[1] is None:
+        return await collection.count_documents(filters[0])
     try:
-        await INDEXED_COLL.update_one(
+        return await collection.count_documents(filters[1])
+    except Exception:
+        logger.exception("count_movies_async failed")
+        return await collection.count_documents(filters[0])
+
+
+async def _backfill_async(query: dict, fields: dict, compute, label: str,
+                          batch_size: int = 500, on_progress=None):
+    """
+    $set compute(doc) on every doc matching `query`, batch by batch in _id
+    order with one bulk_write per batch, then run the change hooks of every
+    chat touched. Returns the number of docs updated.
+    """
+    fields = dict(fields, chat_id=1)
+    last_id = None
+    updated = 0
+    touched = set()
+
+    while True:
+        batch_query = dict(query, _id={"$gt": last_id}) if last_id else query
+        docs = await collection.find(batch_query, fields).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+
+        ops = [UpdateOne({"_id": d["_id"]}, {"$set": compute(d)}) for d in docs]
+        res = await collection.bulk_write(ops, ordered=False)
+        updated += res.modified_count
+        last_id = docs[-1]["_id"]
+        touched.update(d["chat_id"] for d in docs)
+        if on_progress:
+            await on_progress(updated)
+
+    # search indexes and cached searches still hold the old fields
+    for chat_id in touched:
+        await notify_chat_change(chat_id)
+    logger.info(f"🧩 {label} backfill updated {updated} docs")
+    return updated
+
+
+async def backfill_tokens_async(batch_size: int = 500, on_progress=None, force: bool = False):
+    """
+    Add `tokens` to docs stored before the field existed. With force=True
+    every doc is recomputed. Returns the number of docs updated.
+    """
+    query = {} if force else {"tokens": {"$exists": False}}
+    fields = {"title": 1, "year": 1, "quality": 1, "lang": 1, "print": 1,
+              "codec": 1, "caption": 1, "season": 1, "episode": 1}
+    return await _backfill_async(
+        query, fields, lambda d: {"tokens": build_tokens(d)}, "Token",
+        batch_size=batch_size, on_progress=on_progress
+    )
+
+
+async def backfill_episode_fields_async(batch_size: int = 500, on_progress=None, force: bool = False):
+    """
+    Add season_num / ep_start / ep_end / is_complete to docs stored before
+    they existed (is_complete is set on every new doc). Fields without a
+    value are left unset, as build_movie_doc does.
+    """
+    query = {} if force else {"is_complete": {"$exists": False}}
+
+    def compute(doc):
+        fields = episode_fields(doc.get("season"), doc.get("episode"))
+        return {k: v for k, v in fields.items() if v is not None}
+
+    return await _backfill_async(
+        query, {"season": 1, "episode": 1}, compute, "Season/episode",
+        batch_size=batch_size, on_progress=on_progress
+    )
+
+
+# Fields searches filter on, with the filter of docs stored before they
+# existed: /migrate name, label, filter, backfill
+AUTO_BACKFILLS = [
+    ("tokens", "search tokens", {"tokens": {"$exists": False}}, backfill_tokens_async),
+    ("seasons", "season/episode ranges", {"is_complete": {"$exists": False}}, backfill_episode_fields_async),
+]
+_AUTO_BACKFILL = {"task": None}
+
+
+async def uncollapsed_docs_async() -> int:
+    """With SHARED_STORAGE: docs still stored under a target chat that is not a source."""
+    if not SHARED_STORAGE:
+        return 0
+    links = await get_links_async()
+    sources = {link["source_chat"] for link in links}
+    targets = list({link["target_chat"] for link in links} - sources)
+    return await collection.count_documents({"chat_id": {"$in": targets}}) if targets else 0
+
+
+async def auto_backfill_async():
+    """
+    Backfill the AUTO_BACKFILLS fields of docs stored before they existed.
+    Searches filtering on a missing field can't find such docs, so a
+    warning is logged until none is left. Docs SHARED_STORAGE searches
+    don't read yet are reported too.
+    """
+    try:
+        uncollapsed = await uncollapsed_docs_async()
+        if uncollapsed:
+            logger.warning(f"⚠️ SHARED_STORAGE is on but {uncollapsed} docs are still stored per target "
+                           f"and missed by searches, run /migrate shared")
+    except Exception:
+        logger.exception("Checking for per-target docs failed")
+
+    for name, label, query, backfill in AUTO_BACKFILLS:
+        missing = await collection.count_documents(query)
+        if not missing:
+            continue
+        logger.warning(f"⚠️ {missing} docs have no {label} and are missed by searches, backfilling them")
+        last_log = time.monotonic()
+
+        async def progress(updated):
+            nonlocal last_log
+            if time.monotonic() - last_log >= 30:
+                last_log = time.monotonic()
+                logger.warning(f"⚠️ {max(missing - updated, 0)} docs still have no {label}, backfill running")
+
+        try:
+            await backfill(on_progress=progress)
+        except Exception:
+            logger.exception(f"{label} backfill failed")
+        left = await collection.count_documents(query)
+        if left:
+            logger.warning(f"⚠️ {left} docs still have no {label}, run /migrate {name}")
+
+
+def start_auto_backfill():
+    """Run auto_backfill_async in the background, unless it already runs."""
+    task = _AUTO_BACKFILL["task"]
+    if task is None or task.done():
+        _AUTO_BACKFILL["task"] = asyncio.create_task(auto_backfill_async())
+
+
+def _source_from_link(link) -> int:
+    """Source chat of a private-chat post link (t.me/c/<id>/<msg>), else None."""
+    m = re.search(r"t\.me/c/(\d+)/\d+", link or "")
+    return int(f"-100{m.group(1)}") if m else None
+
+
+async def collapse_shared_storage_async(batch_size: int = 500, on_progress=None, force: bool = False):
+    """
+    Move docs stored per target chat to their source chat (SHARED_STORAGE).
+
+    The source comes from the doc's post link, or is the target's only
+    linked source. Docs whose source can't be told apart are left in
+    place. A doc whose file the source already holds is a duplicate and is
+    deleted. Chats that are a source themselves are skipped; with force,
+    only their docs whose link names one of their sources are moved.
+    Returns the number of docs moved or deleted.
+    """
+    if not SHARED_STORAGE:
+        raise RuntimeError("Set SHARED_STORAGE=True before collapsing per-target copies")
+
+    links = await get_links_async()
+    sources_of = {}
+    for link in links:
+        sources_of.setdefault(link["target_chat"], set()).add(link["source_chat"])
+    # a chat that is also a source already holds shared docs
+    all_sources = {link["source_chat"] for link in links}
+    done = 0
+    touched = set()
+
+    for target, sources in sources_of.items():
+        only = next(iter(sources)) if len(sources) == 1 else None
+        if target in all_sources:
+            if not force:
+                logger.warning(f"⚠️ Chat {target} is both a source and a target, skipped (use force)")
+                continue
+            # its own posts are stored under it too, never guess a source
+            only = None
+        last_id = None
+        while True:
+            query = {"chat_id": target}
+            if last_id:
+                query["_id"] = {"$gt": last_id}
+            docs = await collection.find(query, {"link": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+
+            moves = []
+            for doc in docs:
+                source = _source_from_link(doc.get("link"))
+                source = source if source in sources else only
+                if source is not None:
+                    moves.append((doc["_id"], source))
+            if not moves:
+                continue
+
+            dupes = []
+            try:
+                res = await collection.bulk_write(
+                    [UpdateOne({"_id": doc_id}, {"$set": {"chat_id": source}}) for doc_id, source in moves],
+                    ordered=False
+                )
+                done += res.modified_count
+            except BulkWriteError as bwe:
+                details = bwe.details or {}
+                done += details.get("nModified", 0)
+                for err in details.get("writeErrors", []):
+                    if err.get("code") == 11000:
+                        dupes.append(moves[err["index"]][0])
+                    else:
+                        logger.warning(f"⚠️ Moving doc failed: {err.get('errmsg')}")
+            if dupes:
+                res = await collection.delete_many({"_id": {"$in": dupes}})
+                done += res.deleted_count
+
+            touched.add(target)
+            touched.update(source for _, source in moves)
+            if on_progress:
+                await on_progress(done)
+
+    for chat_id in touched:
+        await notify_chat_change(chat_id)
+    logger.info(f"🧩 Shared storage migration moved or removed {done} docs")
+    return done
+
+
+async def mark_indexed_chat_async(target_chat: int, source_chat: int, last_msg_id: int = None):
+    """Link one target chat with one source, raising its high-water mark to last_msg_id."""
+    try:
+        update = {"$set": {"target_chat": target_chat, "source_chat": source_chat}}
+        if last_msg_id:
+            update["$max"] = {"last_msg_id": int(last_msg_id)}
+        res = await INDEXED_COLL.update_one(
             {"target_chat": target_chat, "source_chat": source_chat},
-            {"$set": {"target_chat": target_chat, "source_chat": source_chat}},
+            update,
             upsert=True
         )
+        LINKS.add(target_chat, source_chat, res.upserted_id)
         logger.info(f"🔗 Linked target {target_chat} with source {source_chat}")
     except Exception:
         logger.exception("mark_indexed_chat_async failed")
 
 
+async def bump_high_water_async(source_chat: int, msg_id: int, target_chat: int = None,
+                                contiguous: bool = False):
+    """
+    Raise last_msg_id of a source's links (or one link) after new posts are
+    indexed. With contiguous=True only links already marked up to msg_id - 1
+    move, so a live post never jumps a mark over messages /sync hasn't seen.
+    """
+    try:
+        query = {"source_chat": source_chat}
+        if target_chat is not None:
+            query["target_chat"] = target_chat
+        if contiguous:
+            query["last_msg_id"] = {"$gte": int(msg_id) - 1}
+        await INDEXED_COLL.update_many(query, {"$max": {"last_msg_id": int(msg_id)}})
+    except Exception:
+        logger.exception("bump_high_water_async failed")
+
+
+async def get_links_async() -> list:
+    """All target/source links with their high-water marks."""
+    try:
+        return await INDEXED_COLL.find(
+            {}, {"_id": 0, "target_chat": 1, "source_chat": 1, "last_msg_id": 1}
+        ).to_list(length=None)
+    except Exception:
+        logger.exception("get_links_async failed")
+        return []
+
+
 async def unmark_indexed_chat_async(target_chat: int, source_chat: int = None):
     """Remove mapping(s) for a target-source pair or entire target."""
     try:
@@ -248,15 +974,29 @@ async def unmark_indexed_chat_async(target_chat: int, source_chat: int = None):
             result = await INDEXED_COLL.delete_one(
                 {"target_chat": target_chat, "source_chat": source_chat}
             )
+            LINKS.remove(target_chat, source_chat)
             logger.info(f"❌ Unlinked target {target_chat} from source {source_chat} ({result.deleted_count} removed)")
         else:
             result = await INDEXED_COLL.delete_many({"target_chat": target_chat})
+            LINKS.remove(target_chat)
             logger.info(f"❌ Unlinked all mappings for target {target_chat} ({result.deleted_count} removed)")
     except Exception:
         logger.exception("unmark_indexed_chat_async failed")
 
 
+async def load_link_map():
+    """Load the link table into memory and follow it with a change stream if LINK_WATCH."""
+    try:
+        await LINKS.load()
+        if LINK_WATCH:
+            LINKS.start_watcher()
+    except Exception:
+        logger.exception("load_link_map failed")
+
+
 async def is_source_linked_to_target(target_chat: int, source_chat: int):
+    if LINKS.loaded:
+        return LINKS.is_linked(target_chat, source_chat)
     try:
         doc = await INDEXED_COLL.find_one(
             {"target_chat": target_chat, "source_chat": source_chat},
@@ -269,6 +1009,8 @@ async def is_source_linked_to_target(target_chat: int, source_chat: int):
 
 async def is_source_in_db(source_chat: int) -> bool:
     """Get all targets linked to a source."""
+    if LINKS.loaded:
+        return LINKS.targets_for(source_chat)
     try:
         docs = await INDEXED_COLL.find(
             {"source_chat": source_chat}, {"target_chat": 1}
@@ -280,6 +1022,8 @@ async def is_source_in_db(source_chat: int) -> bool:
         
 async def is_chat_linked_async(target_chat: int) -> bool:
     """Check if target chat is already linked."""
+    if LINKS.loaded:
+        return LINKS.is_linked(target_chat)
     try:
         doc = await INDEXED_COLL.find_one({"target_chat": target_chat})
         return bool(doc)
@@ -287,6 +1031,52 @@ async def is_chat_linked_async(target_chat: int) -> bool:
         logger.exception("is_chat_linked_async failed")
         return False
 
+
+def storage_chat(target_chat: int, source_chat: int) -> int:
+    """chat_id of docs indexed from source_chat for target_chat: the source with SHARED_STORAGE."""
+    return int(source_chat) if SHARED_STORAGE else int(target_chat)
+
+
+async def get_sources_async(target_chat: int) -> list:
+    """All sources linked to a target."""
+    if LINKS.loaded:
+        return LINKS.sources_for(target_chat)
+    try:
+        docs = await INDEXED_COLL.find(
+            {"target_chat": target_chat}, {"source_chat": 1}
+        ).to_list(length=None)
+        return [d["source_chat"] for d in docs]
+    except Exception:
+        logger.exception("get_sources_async failed")
+        return []
+
+
+async def storage_chats_async(chat_id: int) -> list:
+    """chat_ids whose docs a search in chat_id reads."""
+    if not SHARED_STORAGE:
+        return [int(chat_id)]
+    return sorted(await get_sources_async(int(chat_id)))
+
+
+async def dependent_chats_async(chat_id: int) -> list:
+    """Chats whose searches read the docs stored under chat_id, itself included."""
+    if not SHARED_STORAGE:
+        return [int(chat_id)]
+    return [int(chat_id)] + [t for t in await is_source_in_db(int(chat_id)) if t != chat_id]
+
+
+async def delete_link_data_async(target_chat: int, source_chat: int) -> int:
+    """
+    Delete the docs a target-source link brought in. With SHARED_STORAGE
+    the source's docs are kept while another target still links it.
+    """
+    if not SHARED_STORAGE:
+        return await delete_chat_data_async(target_chat)
+    if any(t != target_chat for t in await is_source_in_db(source_chat)):
+        logger.info(f"♻️ Kept docs of source {source_chat}, still linked to other targets")
+        return 0
+    return await delete_chat_data_async(source_chat)
+
 # Restart Function
 
 async def add_restart_message(msg_id: int, chat_id: int):
@@ -316,3 +1106,91 @@ async def clear_restart_message():
         await RESTART_COLL.delete_many({})
     except Exception as e:
         logger.exception(f"clear_restart_message failed: {e}")
+
+
+# Caption Parse Cache
+
+async def get_parsed_captions(keys: list) -> dict:
+    """Return {key: details} for the cached caption parses that exist."""
+    try:
+        docs = await PARSE_CACHE_COLL.find(
+            {"_id": {"$in": list(keys)}}, {"details": 1}
+        ).to_list(length=None)
+        return {d["_id"]: d.get("details", {}) for d in docs}
+    except Exception:
+        logger.exception("get_parsed_captions failed")
+        return {}
+
+
+async def save_parsed_captions(parsed: dict):
+    """Store {key: details}; keys that already exist are left untouched."""
+    if not parsed:
+        return
+    now = datetime.now(timezone.utc)
+    try:
+        await PARSE_CACHE_COLL.insert_many(
+            [{"_id": key, "details": details, "created_at": now} for key, details in parsed.items()],
+            ordered=False
+        )
+    except BulkWriteError:
+        pass
+    except Exception:
+        logger.exception("save_parsed_captions failed")
+
+
+# Index Jobs
+
+async def create_index_job_async(kind: str, user_id: int, target_chat: int, source_chat: int,
+                                 start_msg_id: int, last_msg_id: int,
+                                 progress_chat: int, progress_msg: int):
+    """Persist a new /index or /reindex job and return its id."""
+    now = time.time()
+    res = await JOBS_COLL.insert_one({
+        "kind": kind,
+        "user_id": user_id,
+        "target_chat": target_chat,
+        "source_chat": source_chat,
+        "start_msg_id": start_msg_id,
+        "last_msg_id": last_msg_id,
+        "checkpoint": last_msg_id,
+        "counters": {},
+        "status": "running",
+        "progress_chat": progress_chat,
+        "progress_msg": progress_msg,
+        "created_at": now,
+        "updated_at": now,
+    })
+    logger.info(f"📝 Created {kind} job {res.inserted_id} ({source_chat} → {target_chat})")
+    return res.inserted_id
+
+
+async def update_index_job_async(job_id, **fields):
+    """Update checkpoint / counters / status of a job."""
+    try:
+        fields["updated_at"] = time.time()
+        await JOBS_COLL.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+    except Exception:
+        logger.exception("update_index_job_async failed")
+
+
+async def get_index_jobs_async(statuses: list = None, limit: int = 50):
+    """Jobs with the given statuses, newest first."""
+    try:
+        query = {"status": {"$in": statuses}} if statuses else {}
+        return await JOBS_COLL.find(query).sort("updated_at", -1).to_list(length=limit)
+    except Exception:
+        logger.exception("get_index_jobs_async failed")
+        return []
+
+
+async def pause_running_jobs_async():
+    """Mark running jobs as paused (graceful shutdown); they resume on next start."""
+    try:
+        res = await JOBS_COLL.update_many(
+            {"status": "running"},
+            {"$set": {"status": "paused", "updated_at": time.time()}}
+        )
+        return res.modified_count
+    except Exception:
+        logger.exception("pause_running_jobs_async failed")
+        return 0
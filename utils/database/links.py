@@ -0,0 +1,111 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LinkMap:
+    """
+    In-process copy of the indexed_chats link table.
+
+    The table is tiny and changes only on /index, /delete and friends, yet it
+    is consulted for every group message and every userbot media post. Keep
+    source→targets and target→sources maps in memory, update them on local
+    link/unlink, and optionally follow a change stream so several bot
+    instances stay in sync.
+    """
+
+    def __init__(self, coll):
+        self.coll = coll
+        self.loaded = False
+        self._by_source = {}
+        self._by_target = {}
+        self._ids = {}
+        self._watcher = None
+
+    async def load(self):
+        by_source, by_target, ids = {}, {}, {}
+        async for doc in self.coll.find({}, {"target_chat": 1, "source_chat": 1}):
+            target, source = doc.get("target_chat"), doc.get("source_chat")
+            if target is None or source is None:
+                continue
+            by_source.setdefault(source, set()).add(target)
+            by_target.setdefault(target, set()).add(source)
+            ids[doc["_id"]] = (target, source)
+
+        self._by_source, self._by_target, self._ids = by_source, by_target, ids
+        self.loaded = True
+        logger.info(f"🗺️ Loaded {len(ids)} chat links into memory")
+
+    def add(self, target_chat: int, source_chat: int, doc_id=None):
+        self._by_source.setdefault(source_chat, set()).add(target_chat)
+        self._by_target.setdefault(target_chat, set()).add(source_chat)
+        if doc_id is not None:
+            self._ids[doc_id] = (target_chat, source_chat)
+
+    def remove(self, target_chat: int, source_chat: int = None):
+        sources = [source_chat] if source_chat else list(self._by_target.get(target_chat, ()))
+        for source in sources:
+            targets = self._by_source.get(source)
+            if targets:
+                targets.discard(target_chat)
+                if not targets:
+                    del self._by_source[source]
+            linked = self._by_target.get(target_chat)
+            if linked:
+                linked.discard(source)
+                if not linked:
+                    del self._by_target[target_chat]
+        for doc_id, (target, source) in list(self._ids.items()):
+            if target == target_chat and source in sources:
+                del self._ids[doc_id]
+
+    def targets_for(self, source_chat: int) -> list:
+        return list(self._by_source.get(source_chat, ()))
+
+    def sources_for(self, target_chat: int) -> list:
+        return list(self._by_target.get(target_chat, ()))
+
+    def is_linked(self, target_chat: int, source_chat: int = None) -> bool:
+        sources = self._by_target.get(target_chat)
+        if not sources:
+            return False
+        return source_chat is None or source_chat in sources
+
+    def __len__(self):
+        return sum(len(t) for t in self._by_source.values())
+
+    def start_watcher(self):
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    async def _watch(self):
+        """Follow indexed_chats changes made by other instances (needs a replica set)."""
+        delay = 5
+        while True:
+            try:
+                async with self.coll.watch(full_document="updateLookup") as stream:
+                    # Changes between load() and the stream opening would be missed.
+                    await self.load()
+                    delay = 5
+                    async for change in stream:
+                        op = change.get("operationType")
+                        doc = change.get("fullDocument") or {}
+                        doc_id = change.get("documentKey", {}).get("_id")
+                        if op in ("insert", "update", "replace") and doc:
+                            self.add(doc["target_chat"], doc["source_chat"], doc_id)
+                        elif op == "delete" and doc_id in self._ids:
+                            self.remove(*self._ids[doc_id])
+                        else:
+                            await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Link watcher stopped ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 300)
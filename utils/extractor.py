@@ -1,23 +1,50 @@
 import re
 from PTT import parse_title
 
-def extract_details(caption: str):
-    if not caption or len(caption.strip()) < 2:
-        return {}
+# Bump whenever the parsed output changes, so cached parses are not reused.
+EXTRACTOR_VERSION = 1
 
-    # --- Parse using PTT (except lang & quality) ---
-    try:
-        data = parse_title(caption, translate_languages=True) or {}
-    except Exception as e:
-        print(f"[PTT Error] {e}")
-        data = {}
+# Fields the fast path and PTT both produce (lang & quality are always manual).
+PARSED_FIELDS = ("title", "year", "print", "season", "episode", "codec")
+
+LANG_RE = re.compile(
+    r"\[([^\]]*?(?:Hin|Hindi|Tam|Tamil|Tel|Telugu|Eng|English|Kan|Kannada|Mal|Malayalam|Beng|Bengali|Mar|Marathi)[^\]]*?)\]",
+    re.IGNORECASE
+)
+QUALITY_RE = re.compile(r"(2160p|1440p|1080p|720p|480p|360p|4K|8K)", re.IGNORECASE)
+EPISODE_RE = re.compile(
+    r"(?:E|Ep|Episode)\s*(\d{1,3})(?:\s*(?:-|to)\s*(\d{1,3}))?",
+    re.IGNORECASE
+)
 
-    # ---------- Manual Language Extraction ----------
-    lang_match = re.search(
-        r"\[([^\]]*?(?:Hin|Hindi|Tam|Tamil|Tel|Telugu|Eng|English|Kan|Kannada|Mal|Malayalam|Beng|Bengali|Mar|Marathi)[^\]]*?)\]",
-        caption,
-        re.IGNORECASE
-    )
+# ---------- Fast path: scene-style file names ----------
+# e.g. Movie.Name.2023.1080p.WEB-DL.x264-GRP.mkv / Show.Name.S01E05.720p.HDTV.x265
+FAST_EXT_RE = re.compile(r"\.(?:mkv|mp4|avi|m4v|webm|mov|wmv)$", re.IGNORECASE)
+FAST_REJECT_RE = re.compile(
+    r"[\[\](){}@#|:\n]|https?://|t\.me/|\bcomplete\b|\bseason\b|\bepisodes?\b|\bremux\b"
+    r"|s\d{1,2}e\d{1,3}\s*(?:-|e\d)",
+    re.IGNORECASE
+)
+FAST_TOKEN_RE = re.compile(r"[^.\s_]+")
+FAST_YEAR_RE = re.compile(r"^(?:19|20)\d{2}$")
+FAST_SXXEYY_RE = re.compile(r"^s(\d{1,2})e(\d{1,3})$", re.IGNORECASE)
+FAST_RES_RE = re.compile(r"^(?:(?:2160|1440|1080|720|480|360)p|[48]k)$", re.IGNORECASE)
+FAST_SOURCES = {
+    "web-dl": "WEB-DL", "webdl": "WEB-DL", "webrip": "WEBRip", "web-rip": "WEBRip",
+    "web": "WEB", "bluray": "BluRay", "blu-ray": "BluRay", "brrip": "BRRip",
+    "bdrip": "BDRip", "hdrip": "HDRip", "hdtv": "HDTV", "dvdrip": "DVDRip",
+    "hdts": "TeleSync", "telesync": "TeleSync", "hdcam": "CAM", "cam": "CAM",
+    "hdtc": "TeleCine", "dvdscr": "SCR",
+}
+FAST_CODECS = {
+    "x264": "AVC", "h264": "AVC", "avc": "AVC",
+    "x265": "HEVC", "h265": "HEVC", "hevc": "HEVC",
+    "xvid": "XVID", "divx": "XVID", "av1": "AV1",
+}
+
+
+def _manual_lang(caption: str):
+    lang_match = LANG_RE.search(caption)
     lang = None
     if lang_match:
         raw_lang = lang_match.group(1)
@@ -28,21 +55,25 @@ def extract_details(caption: str):
         lang = ", ".join(sorted(set(langs)))
     if lang:
         lang = f"[{lang}]"
+    return lang
+
 
-    # ---------- Manual Quality (Resolution) Extraction ----------
-    quality = None
-    q_match = re.search(
-        r"(2160p|1440p|1080p|720p|480p|360p|4K|8K)", caption, re.IGNORECASE
-    )
+def _manual_quality(caption: str):
+    q_match = QUALITY_RE.search(caption)
     if q_match:
-        quality = q_match.group(1).upper().replace("P", "p")
+        return q_match.group(1).upper().replace("P", "p")
+    return None
+
+
+def _ptt_fields(caption: str) -> dict:
+    # --- Parse using PTT (except lang & quality) ---
+    try:
+        data = parse_title(caption, translate_languages=True) or {}
+    except Exception as e:
+        print(f"[PTT Error] {e}")
+        data = {}
 
-    # ---------- Other Fields from PTT ----------
-    title = data.get("title")
-    year = data.get("year")
     codec = data.get("codec")
-    codec = codec.upper() if codec else None
-    print_type = data.get("quality") or data.get("source")
 
     # ---------- Season & Episode ----------
     seasons = data.get("seasons", [])
@@ -57,22 +88,164 @@ def extract_details(caption: str):
     elif episodes:
         episode = f"{episodes[0]}-{episodes[-1]}" if len(episodes) > 1 else str(episodes[0])
     else:
-        ep_match = re.search(
-            r"(?:E|Ep|Episode)\s*(\d{1,3})(?:\s*(?:-|to)\s*(\d{1,3}))?",
-            caption,
-            re.IGNORECASE,
-        )
+        ep_match = EPISODE_RE.search(caption)
         if ep_match:
             start, end = ep_match.groups()
             episode = f"{start}-{end}" if end else start
 
     return {
-        "title": title,
-        "year": year,
-        "quality": quality,
-        "lang": lang,
-        "print": print_type,
+        "title": data.get("title"),
+        "year": data.get("year"),
+        "print": data.get("quality") or data.get("source"),
         "season": season,
         "episode": episode,
-        "codec": codec,
+        "codec": codec.upper() if codec else None,
+    }
+
+
+def fast_parse(caption: str):
+    """
+    Single-pass tokenizer for scene-style names.
+
+    Returns (fields, confident). Title ends at the first year/SxxEyy/
+    resolution/source/codec marker; the result is only confident when the
+    title is followed by a year or SxxEyy and nothing ambiguous (brackets,
+    packs, episode ranges, links) was seen. Otherwise callers use PTT.
+    """
+    name = caption.strip()
+    if not name or len(name) > 200 or FAST_REJECT_RE.search(name):
+        return None, False
+
+    tokens = FAST_TOKEN_RE.findall(FAST_EXT_RE.sub("", name))
+    fields = dict.fromkeys(PARSED_FIELDS)
+    marker = None
+
+    for i, token in enumerate(tokens):
+        low = token.lower()
+        base = low.rsplit("-", 1)[0] if low.count("-") and low not in FAST_SOURCES else low
+        sxe = FAST_SXXEYY_RE.match(token)
+
+        if sxe:
+            if fields["season"] is not None:
+                return None, False
+            fields["season"] = int(sxe.group(1))
+            fields["episode"] = str(int(sxe.group(2)))
+        elif FAST_RES_RE.match(low):
+            pass
+        elif low in FAST_SOURCES or base in FAST_SOURCES:
+            fields["print"] = fields["print"] or FAST_SOURCES.get(low) or FAST_SOURCES[base]
+        elif base in FAST_CODECS:
+            fields["codec"] = fields["codec"] or FAST_CODECS[base]
+        elif low == "h" and i + 1 < len(tokens) and tokens[i + 1].split("-")[0] in ("264", "265"):
+            fields["codec"] = fields["codec"] or FAST_CODECS["h" + tokens[i + 1][:3]]
+        else:
+            continue
+
+        if marker is None:
+            marker = i
+
+    if marker is None:
+        marker = len(tokens)
+
+    title_tokens = tokens[:marker]
+    if title_tokens and FAST_YEAR_RE.match(title_tokens[-1]):
+        fields["year"] = int(title_tokens.pop())
+    elif fields["season"] is None or not FAST_SXXEYY_RE.match(tokens[marker]):
+        return None, False
+
+    if not title_tokens:
+        return None, False
+
+    fields["title"] = " ".join(title_tokens)
+    return fields, True
+
+
+def _extract(caption: str, mode: str, fields: dict = None):
+    """Details of a caption; `fields` are its PTT fields when the caller already has them."""
+    used_fast = False
+    if mode == "on" and fields is None:
+        fields, used_fast = fast_parse(caption)
+        if not used_fast:
+            fields = None
+    if fields is None:
+        fields = _ptt_fields(caption)
+
+    details = {
+        "title": fields["title"],
+        "year": fields["year"],
+        "quality": _manual_quality(caption),
+        "lang": _manual_lang(caption),
+        "print": fields["print"],
+        "season": fields["season"],
+        "episode": fields["episode"],
+        "codec": fields["codec"],
     }
+    return details, used_fast
+
+
+def extract_details(caption: str, mode: str = "off"):
+    """
+    Parse a caption / file name into movie fields.
+
+    mode: "off" always uses PTT, "on" uses the fast path when it is
+    confident and PTT otherwise, "compare" always returns PTT's answer
+    (use compare_parsers to see where the fast path disagrees).
+    """
+    if not caption or len(caption.strip()) < 2:
+        return {}
+    return _extract(caption, mode)[0]
+
+
+def compare_parsers(caption: str, ptt: dict = None):
+    """
+    Return the fields where a confident fast parse differs from PTT (None if
+    not comparable). Pass PTT's fields as `ptt` if they are already parsed.
+    """
+    if not caption or len(caption.strip()) < 2:
+        return None
+    fast, confident = fast_parse(caption)
+    if not confident:
+        return None
+    if ptt is None:
+        ptt = _ptt_fields(caption)
+    return {f: (fast[f], ptt[f]) for f in PARSED_FIELDS if fast[f] != ptt[f]}
+
+
+def warm_up(mode: str = "off"):
+    """Parser pool initializer: load PTT and compile its patterns before the first batch."""
+    extract_details("Warm.Up.2020.1080p.WEB-DL.x264.mkv", mode)
+
+
+def extract_details_many(captions, mode: str = "off"):
+    """
+    Parse a batch of captions in one call, so a process pool pays one IPC hop per batch.
+
+    Returns (results, report); report counts fast-path use and, in
+    "compare" mode, PTT disagreements with a few samples for the logs.
+    """
+    results = []
+    report = {"fast": 0, "fallback": 0, "compared": 0, "disagreed": 0, "samples": []}
+    for caption in captions:
+        try:
+            if not caption or len(caption.strip()) < 2:
+                results.append({})
+                continue
+            fields = None
+            if mode == "compare":
+                # parsed once, for the comparison and the result
+                fields = _ptt_fields(caption)
+                diff = compare_parsers(caption, fields)
+                if diff is not None:
+                    report["compared"] += 1
+                    if diff:
+                        report["disagreed"] += 1
+                        if len(report["samples"]) < 5:
+                            report["samples"].append((caption, diff))
+            details, used_fast = _extract(caption, mode, fields)
+            if mode == "on":
+                report["fast" if used_fast else "fallback"] += 1
+            results.append(details)
+        except Exception as e:
+            print(f"[Extractor Error] {e}")
+            results.append({})
+    return results, report
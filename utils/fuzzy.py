@@ -0,0 +1,266 @@
+import time
+import asyncio
+import logging
+from info import FUZZY_SEARCH, FUZZY_MAX_DISTANCE
+from utils.database import collection, on_chat_change, storage_chats_async
+from .query import tokenize, normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Fields whose words make up a chat's vocabulary
+VOCAB_FIELDS = ("title", "lang", "print", "codec")
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class SymSpell:
+    """
+    Symmetric-delete spelling dictionary.
+
+    Every word is stored under all strings reachable by deleting up to
+    `max_distance` characters of its first `prefix_length` characters. A
+    lookup generates the same deletes of the input, so candidates come from
+    dict hits only and just those are verified with edit_distance.
+    """
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = {}
+        self.deletes = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def _edit_levels(self, word: str, max_distance: int):
+        """Yield (deletes, strings) for 0..max_distance deletes of word."""
+        frontier = {word}
+        seen = set(frontier)
+        yield 0, frontier
+        for level in range(1, max_distance + 1):
+            frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))} - seen
+            seen |= frontier
+            yield level, frontier
+
+    def _edits(self, word: str) -> set:
+        edits = set()
+        for _, frontier in self._edit_levels(word, self.max_distance):
+            edits |= frontier
+        return edits
+
+    def add(self, word: str, count: int = 1):
+        if word in self.words:
+            self.words[word] += count
+            return
+        self.words[word] = count
+        for edit in self._edits(word[:self.prefix_length]):
+            bucket = self.deletes.get(edit)
+            if bucket is None:
+                self.deletes[edit] = word
+            elif isinstance(bucket, str):
+                self.deletes[edit] = [bucket, word]
+            else:
+                bucket.append(word)
+
+    def lookup(self, word: str, max_distance: int = None):
+        """Closest known word as (word, distance), most frequent on ties, or None."""
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if word in self.words:
+            return word, 0
+
+        best = None
+        seen = set()
+        for level, frontier in self._edit_levels(word[:self.prefix_length], limit):
+            # a word at distance d is reachable with at most d deletes of the input
+            if best is not None and level > best[0][0]:
+                break
+            for edit in frontier:
+                bucket = self.deletes.get(edit)
+                if bucket is None:
+                    continue
+                for candidate in ((bucket,) if isinstance(bucket, str) else bucket):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = edit_distance(word, candidate, limit)
+                    if distance > limit:
+                        continue
+                    key = (distance, -self.words[candidate])
+                    if best is None or key < best[0]:
+                        best = (key, candidate)
+        if best is None:
+            return None
+        return best[1], best[0][0]
+
+    def memory_entries(self) -> int:
+        return len(self.words) + len(self.deletes)
+
+
+class ChatVocabulary:
+    """
+    Per-chat SymSpell dictionaries of title words, loaded on a chat's first
+    zero-hit query and kept current by the chat change hook. The words are
+    streamed from Mongo and the dictionary is built on a thread, so the
+    event loop keeps serving; the query that started the load waits for it.
+    """
+
+    def __init__(self):
+        self._chats = {}
+        self._loading = {}
+        self._pending = {}
+        self.rewrites = 0
+        self.lookups = 0
+
+    async def get(self, chat_id: int):
+        """The chat's dictionary, loading it first if needed; None if loading failed."""
+        vocab = self._chats.get(chat_id)
+        if vocab is not None:
+            return vocab
+        task = self._loading.get(chat_id)
+        if task is None:
+            task = self._loading[chat_id] = asyncio.ensure_future(self._load(chat_id))
+            self._pending[chat_id] = []
+        # shield: a cancelled search must not abort the load for the others
+        return await asyncio.shield(task)
+
+    async def _load(self, chat_id: int):
+        started = time.monotonic()
+        projection = {field: 1 for field in VOCAB_FIELDS}
+        task = self._loading[chat_id]
+        try:
+            docs = await collection.find({"chat_id": chat_id}, projection).to_list(length=None)
+            vocab = await asyncio.to_thread(self._build, docs)
+        except Exception:
+            logger.exception(f"Loading fuzzy vocabulary of chat {chat_id} failed")
+            return None
+        finally:
+            pending = self._pending.pop(chat_id, []) if self._loading.get(chat_id) is task else None
+            if pending is not None:
+                del self._loading[chat_id]
+        if pending is None:
+            # dropped while loading, the docs read may be gone
+            return None
+        # docs saved while the dictionary was built
+        for doc in pending:
+            self._add_doc(vocab, doc)
+        self._chats[chat_id] = vocab
+        logger.info(
+            f"🔤 Loaded {len(vocab)} words for chat {chat_id} "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        return vocab
+
+    @classmethod
+    def _build(cls, docs: list) -> SymSpell:
+        vocab = SymSpell(max_distance=FUZZY_MAX_DISTANCE)
+        for doc in docs:
+            cls._add_doc(vocab, doc)
+        return vocab
+
+    @staticmethod
+    def _add_doc(vocab: SymSpell, doc: dict):
+        for field in VOCAB_FIELDS:
+            for word in tokenize(doc.get(field)):
+                if len(word) > 2 and not word.isdigit():
+                    vocab.add(word)
+
+    def add_docs(self, chat_id: int, docs: list):
+        if chat_id in self._pending:
+            self._pending[chat_id].extend(docs)
+            return
+        vocab = self._chats.get(chat_id)
+        if vocab is None:
+            return
+        for doc in docs:
+            self._add_doc(vocab, doc)
+
+    def drop(self, chat_id: int):
+        self._chats.pop(chat_id, None)
+        self._loading.pop(chat_id, None)
+        self._pending.pop(chat_id, None)
+
+    def clear(self):
+        """Forget every chat's dictionary (e.g. after /resetdb)."""
+        for chat_id in list(self._chats) + list(self._loading):
+            self.drop(chat_id)
+
+    async def rewrite(self, chat_ids: list, query: str):
+        """
+        The query with unknown words replaced by their closest word in the
+        chats' dictionaries, or None when nothing could be corrected. Words
+        with digits (1080p, s01, 2023) and short words are left alone.
+        """
+        vocabs = [vocab for vocab in await asyncio.gather(*map(self.get, chat_ids)) if vocab is not None]
+        if not vocabs:
+            return None
+        self.lookups += 1
+        changed = False
+        words = []
+        for word in normalize_query(query).split():
+            if len(word) > 3 and not any(ch.isdigit() for ch in word):
+                # one typo in short words, up to FUZZY_MAX_DISTANCE in longer ones
+                limit = 1 if len(word) <= 5 else None
+                matches = [m for m in (v.lookup(word, limit) for v in vocabs) if m]
+                # known somewhere, or the closest spelling across the chats
+                if matches and min(m[1] for m in matches):
+                    word, changed = min(matches, key=lambda m: m[1])[0], True
+            words.append(word)
+        if not changed:
+            return None
+        self.rewrites += 1
+        return normalize_query(" ".join(words))
+
+    def stats(self) -> dict:
+        return {
+            "chats": len(self._chats),
+            "words": sum(len(v) for v in self._chats.values()),
+            "entries": sum(v.memory_entries() for v in self._chats.values()),
+            "lookups": self.lookups,
+            "rewrites": self.rewrites,
+        }
+
+
+TITLE_VOCAB = ChatVocabulary()
+
+
+async def suggest_query(chat_id: int, query: str):
+    """Typo-corrected query for a zero-hit search, or None (also when FUZZY_SEARCH is off)."""
+    if not FUZZY_SEARCH:
+        return None
+    try:
+        return await TITLE_VOCAB.rewrite(await storage_chats_async(chat_id), query)
+    except Exception:
+        logger.exception("suggest_query failed")
+        return None
+
+
+def fuzzy_stats() -> dict:
+    return dict(TITLE_VOCAB.stats(), enabled=FUZZY_SEARCH)
+
+
+@on_chat_change
+async def update_title_vocab(chat_id: int, docs: list = None):
+    if docs is None:
+        # deleted or reindexed: reload from Mongo on the next zero-hit query
+        TITLE_VOCAB.drop(chat_id)
+    else:
+        TITLE_VOCAB.add_docs(chat_id, docs)
@@ -0,0 +1,376 @@
+import time
+import asyncio
+import logging
+from pyrogram import raw, utils as pyro_utils
+from pyrogram.enums import MessagesFilter, MessageMediaType
+from pyrogram.errors import FloodWait
+from info import (
+    INDEX_PARSE_WORKERS,
+    INDEX_QUEUE_SIZE,
+    INDEX_PROGRESS_INTERVAL,
+    PARSE_BATCH_SIZE,
+    HISTORY_PAGE_SIZE,
+    INDEX_MEDIA_ONLY
+)
+from utils.database import build_movie_doc, storage_chat, MovieBatchWriter
+from .parser import extract_details_batch_async
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def message_caption(msg):
+    """Caption used for parsing: the post caption or the file name."""
+    return (
+        msg.caption
+        or getattr(msg.video, "file_name", None)
+        or getattr(msg.document, "file_name", None)
+    )
+
+
+def message_file_uid(msg):
+    return (
+        getattr(msg.video, "file_unique_id", None)
+        or getattr(msg.document, "file_unique_id", None)
+    )
+
+
+async def _history_pages(client, chat_id, start_msg_id: int, last_msg_id: int,
+                         filter: MessagesFilter = None, page_size: int = HISTORY_PAGE_SIZE):
+    """
+    Yield messages newest → oldest with ids in [start_msg_id, last_msg_id].
+
+    Uses messages.GetHistory, or messages.Search when a server-side media
+    filter is given. Paging starts right below last_msg_id (None = newest)
+    and min_id stops it at start_msg_id, so nothing outside the range is
+    ever downloaded.
+    """
+    peer = await client.resolve_peer(chat_id)
+    page_size = min(max(1, page_size), 100)
+    offset_id = last_msg_id + 1 if last_msg_id else 0
+    min_id = max(0, (start_msg_id or 0) - 1)
+
+    while True:
+        common = dict(
+            peer=peer, offset_id=offset_id, add_offset=0,
+            limit=page_size, max_id=0, min_id=min_id, hash=0
+        )
+        if filter is None:
+            query = raw.functions.messages.GetHistory(offset_date=0, **common)
+        else:
+            query = raw.functions.messages.Search(
+                q="", filter=filter.value(), min_date=0, max_date=0, **common
+            )
+        r = await client.invoke(query, sleep_threshold=60)
+        messages = await pyro_utils.parse_messages(client, r, replies=0)
+        if not messages:
+            return
+
+        for msg in messages:
+            if msg.id <= min_id:
+                return
+            yield msg
+        offset_id = messages[-1].id
+
+
+async def iter_history(client, chat_id, start_msg_id: int, last_msg_id: int,
+                       media_only: bool = INDEX_MEDIA_ONLY,
+                       page_size: int = HISTORY_PAGE_SIZE):
+    """
+    Range-bounded history reader used by the indexers (newest first).
+
+    With media_only the server filters to videos and documents; the two
+    result streams are merged by id so the output stays strictly descending.
+    """
+    if not media_only:
+        async for msg in _history_pages(client, chat_id, start_msg_id, last_msg_id, page_size=page_size):
+            yield msg
+        return
+
+    streams = [
+        _history_pages(client, chat_id, start_msg_id, last_msg_id, flt, page_size)
+        for flt in (MessagesFilter.VIDEO, MessagesFilter.DOCUMENT)
+    ]
+    heads = {}
+    for stream in streams:
+        try:
+            heads[stream] = await stream.__anext__()
+        except StopAsyncIteration:
+            pass
+
+    last_id = None
+    while heads:
+        stream = max(heads, key=lambda s: heads[s].id)
+        msg = heads[stream]
+        try:
+            heads[stream] = await stream.__anext__()
+        except StopAsyncIteration:
+            del heads[stream]
+        if msg.id != last_id:
+            last_id = msg.id
+            yield msg
+
+
+class IndexStats:
+    """Counters, per-stage busy time and checkpoint of one indexing run."""
+
+    COUNTERS = ("indexed", "duplicates", "errors", "unsupported", "skipped_uid")
+
+    def __init__(self, last_msg_id: int = None, counters: dict = None):
+        base = counters or {}
+        self.base = {name: base.get(name, 0) for name in ("indexed", "duplicates", "errors")}
+        self.writer = None
+        self.fetched = 0
+        self.unsupported = base.get("unsupported", 0)
+        self.skipped_uid = base.get("skipped_uid", 0)
+        self.parse_errors = 0
+        self.cancelled = False
+        self.fetch_time = 0.0
+        self.parse_time = 0.0
+        self.write_time = 0.0
+        self.started = time.monotonic()
+        self.finished = None
+
+        # Message ids fetched but not yet written (or skipped).
+        self.in_flight = set()
+        self.last_msg_id = last_msg_id
+        self.lowest_fetched = None
+        self.highest_fetched = None
+
+    @property
+    def indexed(self):
+        return self.base["indexed"] + (self.writer.saved if self.writer else 0)
+
+    @property
+    def duplicates(self):
+        return self.base["duplicates"] + (self.writer.duplicates if self.writer else 0)
+
+    @property
+    def pending(self):
+        return self.writer.pending if self.writer else 0
+
+    @property
+    def errors(self):
+        return self.base["errors"] + self.parse_errors + (self.writer.errors if self.writer else 0)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def checkpoint(self):
+        """
+        Highest message id that may still be unprocessed; every id above it
+        is durably handled, so a resumed run can use it as its last_msg_id.
+        """
+        if self.in_flight:
+            return max(self.in_flight)
+        if self.lowest_fetched is not None:
+            return self.lowest_fetched - 1
+        return self.last_msg_id
+
+    @property
+    def high_water(self):
+        """
+        For a run that fetched everything down to its start_msg_id: highest
+        message id with every id below it durably handled, None if none is.
+        """
+        if self.cancelled or self.highest_fetched is None:
+            return None
+        if self.in_flight:
+            return min(self.in_flight) - 1
+        return self.highest_fetched
+
+    def counters(self) -> dict:
+        return {name: getattr(self, name) for name in self.COUNTERS}
+
+    def done(self, msg_ids):
+        self.in_flight.difference_update(msg_ids)
+
+    def timings(self) -> str:
+        return (
+            f"⏱ Fetch {self.fetch_time:.1f}s · Parse {self.parse_time:.1f}s · "
+            f"Write {self.write_time:.1f}s · Total {self.elapsed:.1f}s"
+        )
+
+
+async def run_index_pipeline(client, source_chat_id: int, target_chat_id: int,
+                             start_msg_id: int, last_msg_id: int,
+                             should_continue, on_progress=None, counters: dict = None,
+                             parse_workers: int = INDEX_PARSE_WORKERS,
+                             queue_size: int = INDEX_QUEUE_SIZE,
+                             progress_interval: float = INDEX_PROGRESS_INTERVAL) -> IndexStats:
+    """
+    Index `source_chat_id` into `target_chat_id` with overlapping stages:
+
+        history producer → fetch_q → N parse workers → write_q → batch writer
+
+    Both queues are bounded so a slow stage applies back-pressure instead of
+    buffering the whole chat. `should_continue()` is polled by the producer;
+    once it returns False no new messages are fetched, whatever is already
+    queued is drained and `stats.cancelled` is set. `on_progress(stats)` is
+    awaited every `progress_interval` seconds while the run is active.
+
+    `stats.checkpoint` tracks how far the run is durably done; pass it back
+    as `last_msg_id` (with `counters=stats.counters()`) to resume a job.
+    """
+    stats = IndexStats(last_msg_id, counters)
+    parse_workers = max(1, parse_workers)
+    fetch_q = asyncio.Queue(maxsize=queue_size)
+    write_q = asyncio.Queue(maxsize=queue_size)
+
+    async def produce():
+        upper = last_msg_id
+        while True:
+            try:
+                history = iter_history(client.USER, source_chat_id, start_msg_id, upper)
+                while True:
+                    t0 = time.monotonic()
+                    try:
+                        msg = await history.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        stats.fetch_time += time.monotonic() - t0
+
+                    if not should_continue():
+                        stats.cancelled = True
+                        return
+
+                    upper = msg.id - 1
+                    stats.fetched += 1
+                    stats.lowest_fetched = msg.id
+                    if stats.highest_fetched is None:
+                        stats.highest_fetched = msg.id
+                    stats.in_flight.add(msg.id)
+                    await fetch_q.put(msg)
+            except FloodWait as fw:
+                logger.warning(f"FloodWait: sleeping {fw.value}s while fetching {source_chat_id}")
+                await asyncio.sleep(fw.value)
+
+    async def producer():
+        await produce()
+        for _ in range(parse_workers):
+            await fetch_q.put(_DONE)
+
+    async def next_batch():
+        """Block for one message, then take whatever else is already queued."""
+        batch = [await fetch_q.get()]
+        while len(batch) < PARSE_BATCH_SIZE and batch[-1] is not _DONE:
+            try:
+                batch.append(fetch_q.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def parser():
+        done = False
+        while not done:
+            batch = await next_batch()
+            if batch[-1] is _DONE:
+                batch.pop()
+                done = True
+
+            jobs = []
+            for msg in batch:
+                if not msg.media or msg.media not in [MessageMediaType.VIDEO, MessageMediaType.DOCUMENT]:
+                    stats.unsupported += 1
+                    stats.done([msg.id])
+                    continue
+
+                caption = message_caption(msg)
+                if not caption:
+                    stats.unsupported += 1
+                    stats.done([msg.id])
+                    continue
+
+                file_uid = message_file_uid(msg)
+                if not file_uid:
+                    stats.skipped_uid += 1
+                    stats.done([msg.id])
+                    continue
+
+                jobs.append((msg, caption, file_uid))
+
+            if jobs:
+                t0 = time.monotonic()
+                try:
+                    parsed = await extract_details_batch_async([caption for _, caption, _ in jobs])
+                except Exception as e:
+                    # left in flight, so a resumed job or the next /sync parses them again
+                    stats.parse_errors += len(jobs)
+                    logger.warning(f"⚠️ Skipped {len(jobs)} messages due to parse error: {e}")
+                    parsed = []
+                finally:
+                    stats.parse_time += time.monotonic() - t0
+
+                for (msg, caption, file_uid), details in zip(jobs, parsed):
+                    await write_q.put((msg.id, build_movie_doc(
+                        chat_id=storage_chat(target_chat_id, source_chat_id),
+                        title=details.get("title"),
+                        year=details.get("year"),
+                        quality=details.get("quality"),
+                        lang=details.get("lang"),
+                        print_type=details.get("print"),
+                        season=details.get("season"),
+                        episode=details.get("episode"),
+                        codec=details.get("codec"),
+                        caption=caption,
+                        link=msg.link,
+                        file_unique_id=file_uid
+                    )))
+
+        await write_q.put(_DONE)
+
+    async def writer_stage(writer):
+        remaining = parse_workers
+        while remaining:
+            item = await write_q.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            msg_id, doc = item
+            t0 = time.monotonic()
+            await writer.add(doc, tag=msg_id)
+            stats.write_time += time.monotonic() - t0
+
+        t0 = time.monotonic()
+        await writer.flush()
+        stats.write_time += time.monotonic() - t0
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(progress_interval)
+            try:
+                await on_progress(stats)
+            except FloodWait as fw:
+                await asyncio.sleep(fw.value)
+            except Exception as e:
+                logger.warning(f"⚠️ Progress update failed: {e}")
+
+    async with MovieBatchWriter(on_flush=stats.done) as writer:
+        stats.writer = writer
+        tasks = [asyncio.create_task(producer())]
+        tasks += [asyncio.create_task(parser()) for _ in range(parse_workers)]
+        tasks.append(asyncio.create_task(writer_stage(writer)))
+        report_task = asyncio.create_task(reporter()) if on_progress else None
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            if report_task:
+                report_task.cancel()
+                await asyncio.gather(report_task, return_exceptions=True)
+            stats.finished = time.monotonic()
+
+    logger.info(
+        f"📦 Indexed {source_chat_id} → {target_chat_id}: saved={stats.indexed} "
+        f"dupes={stats.duplicates} errors={stats.errors} | {stats.timings()}"
+    )
+    return stats
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from importlib import metadata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from info import PARSE_PROCESSES, PARSE_CACHE_SIZE, PERSIST_PARSE_CACHE, FAST_PARSE_MODE
+from utils.database import get_parsed_captions, save_parsed_captions
+from .extractor import extract_details_many, warm_up, EXTRACTOR_VERSION
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+try:
+    PTT_VERSION = metadata.version("parsett")
+except metadata.PackageNotFoundError:
+    PTT_VERSION = "unknown"
+# Parses change with the extractor, the PTT release and the fast path, so
+# all three are part of the cache key; older entries are never read again.
+CACHE_VERSION = f"{EXTRACTOR_VERSION}-ptt{PTT_VERSION}" + ("-fast" if FAST_PARSE_MODE == "on" else "")
+FAST_PARSE_STATS = {"fast": 0, "fallback": 0, "compared": 0, "disagreed": 0}
+
+
+class CaptionCache:
+    """Bounded LRU of parsed captions keyed by caption hash + extractor version."""
+
+    def __init__(self, max_size: int = PARSE_CACHE_SIZE):
+        self.max_size = max(0, max_size)
+        self._data = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @staticmethod
+    def key(caption: str) -> str:
+        digest = hashlib.blake2b(caption.encode("utf-8", "ignore"), digest_size=16).hexdigest()
+        return f"{CACHE_VERSION}:{digest}"
+
+    def get(self, key: str):
+        details = self._data.get(key)
+        if details is not None:
+            self._data.move_to_end(key)
+        return details
+
+    def put(self, key: str, details: dict):
+        if not self.max_size:
+            return
+        self._data[key] = details
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        hits = self.memory_hits + self.persistent_hits
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": (hits / lookups * 100) if lookups else 0,
+            "persistent": PERSIST_PARSE_CACHE,
+        }
+
+
+CAPTION_CACHE = CaptionCache()
+
+
+def get_parser_pool():
+    """
+    Lazily start the caption parser pool.
+
+    PTT parsing is CPU bound; running it on the event loop stalls every
+    handler of the bot and the userbot. With PARSE_PROCESSES=0 parsing runs
+    on a thread instead (no extra processes, but still holds the GIL).
+
+    Workers come from a forkserver (spawn where that is unavailable):
+    forking the bot itself would copy locks held by Motor's and logging's
+    threads into the children. They only import utils.extractor, which
+    takes its settings as arguments, not the bot's config or clients.
+    """
+    global _pool
+    if _pool is None and PARSE_PROCESSES > 0:
+        try:
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload(["utils.extractor"])
+        except ValueError:
+            ctx = multiprocessing.get_context("spawn")
+        _pool = ProcessPoolExecutor(
+            max_workers=PARSE_PROCESSES, mp_context=ctx, initializer=warm_up, initargs=(FAST_PARSE_MODE,)
+        )
+        logger.info(f"🧵 Caption parser pool started with {PARSE_PROCESSES} processes")
+    return _pool
+
+
+def shutdown_parser_pool(wait: bool = True):
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+        logger.info("🧵 Caption parser pool stopped")
+
+
+def parser_cache_stats() -> dict:
+    return CAPTION_CACHE.stats()
+
+
+def fast_parse_stats() -> dict:
+    return dict(FAST_PARSE_STATS, mode=FAST_PARSE_MODE)
+
+
+def _record_report(report: dict):
+    for name in FAST_PARSE_STATS:
+        FAST_PARSE_STATS[name] += report.get(name, 0)
+    for caption, diff in report.get("samples", []):
+        logger.info(f"🔀 Fast parse disagrees with PTT for {caption!r}: {diff}")
+
+
+async def _parse_uncached(captions: list) -> list:
+    loop = asyncio.get_running_loop()
+    pool = get_parser_pool()
+    if pool is None:
+        results, report = await asyncio.to_thread(extract_details_many, captions, FAST_PARSE_MODE)
+    else:
+        try:
+            results, report = await loop.run_in_executor(
+                pool, extract_details_many, captions, FAST_PARSE_MODE
+            )
+        except Exception as e:
+            # A broken pool (killed worker) must not take indexing down with it.
+            logger.warning(f"⚠️ Parser pool failed ({e}), parsing on a thread")
+            shutdown_parser_pool(wait=False)
+            results, report = await asyncio.to_thread(extract_details_many, captions, FAST_PARSE_MODE)
+
+    _record_report(report)
+    return results
+
+
+async def extract_details_async(caption: str) -> dict:
+    """extract_details off the event loop."""
+    results = await extract_details_batch_async([caption])
+    return results[0]
+
+
+async def extract_details_batch_async(captions: list) -> list:
+    """
+    Parse many captions, cheapest source first: in-process LRU, then the
+    persistent Mongo tier (PERSIST_PARSE_CACHE), then a single hop to the
+    parser pool for whatever is left.
+    """
+    if not captions:
+        return []
+
+    keys = [CaptionCache.key(caption or "") for caption in captions]
+    found = {}
+    missing = {}
+    for key, caption in zip(keys, captions):
+        if key in found or key in missing:
+            continue
+        details = CAPTION_CACHE.get(key)
+        if details is not None:
+            CAPTION_CACHE.memory_hits += 1
+            found[key] = details
+        else:
+            missing[key] = caption
+
+    if missing and PERSIST_PARSE_CACHE:
+        stored = await get_parsed_captions(missing.keys())
+        for key, details in stored.items():
+            CAPTION_CACHE.persistent_hits += 1
+            CAPTION_CACHE.put(key, details)
+            found[key] = details
+            missing.pop(key, None)
+
+    if missing:
+        CAPTION_CACHE.misses += len(missing)
+        parsed = await _parse_uncached(list(missing.values()))
+        fresh = dict(zip(missing.keys(), parsed))
+        for key, details in fresh.items():
+            CAPTION_CACHE.put(key, details)
+        found.update(fresh)
+        if PERSIST_PARSE_CACHE:
+            await save_parsed_captions(fresh)
+
+    return [dict(found[key]) for key in keys]
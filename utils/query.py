@@ -0,0 +1,110 @@
+import re
+import unicodedata
+from .extractor import FAST_CODECS
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Query spellings -> the token stored for the same thing
+TOKEN_ALIASES = {
+    "fhd": "1080p", "fullhd": "1080p",
+    "uhd": "2160p",
+}
+
+
+# Structured query words, matched against single (normalized) tokens
+SXXEYY_RE = re.compile(r"^s(\d{1,2})(?:e(\d{1,3}))?$")
+EPISODE_RE = re.compile(r"^(?:e|ep)(\d{1,3})$")
+YEAR_RE = re.compile(r"^(?:19|20)\d{2}$")
+QUALITY_RE = re.compile(r"^(?:2160|1440|1080|720|480|360)p$")
+# Stored quality spellings of a query resolution (_manual_quality keeps 4K as is)
+QUALITY_VALUES = {"2160p": ["2160p", "4K"], "4k": ["2160p", "4K"], "8k": ["8K"]}
+# Language names and the caption abbreviations stored for them in `lang`
+QUERY_LANGS = {
+    "hindi": ["hindi", "hin"], "tamil": ["tamil", "tam"], "telugu": ["telugu", "tel"],
+    "english": ["english", "eng"], "kannada": ["kannada", "kan"],
+    "malayalam": ["malayalam", "mal"], "bengali": ["bengali", "beng"], "marathi": ["marathi", "mar"],
+}
+QUERY_LANGS.update({"hin": QUERY_LANGS["hindi"], "tam": QUERY_LANGS["tamil"],
+                    "tel": QUERY_LANGS["telugu"], "eng": QUERY_LANGS["english"]})
+
+
+def fold_accents(text: str) -> str:
+    """Strip accents from Latin letters (é -> e) without touching other scripts' marks."""
+    out = []
+    for ch in unicodedata.normalize("NFKD", text):
+        # Devanagari, Tamil etc. vowel signs are combining marks too; keep those
+        if unicodedata.combining(ch) and out and out[-1] < "\u0250":
+            continue
+        out.append(ch)
+    return unicodedata.normalize("NFC", "".join(out))
+
+
+def tokenize(text) -> list:
+    """Lowercased, accent-folded word tokens; punctuation and whitespace split words."""
+    if text is None:
+        return []
+    text = str(text)
+    if text.isascii():
+        return TOKEN_RE.findall(text.lower())
+
+    # \w has no combining marks, which would split कांतारा into क त र
+    tokens, word = [], []
+    for ch in fold_accents(text).lower():
+        if ch.isalnum() or (word and unicodedata.category(ch)[0] == "M"):
+            word.append(ch)
+        elif word:
+            tokens.append("".join(word))
+            word = []
+    if word:
+        tokens.append("".join(word))
+    return tokens
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a search query: folded tokens with aliases applied,
+    deduplicated and sorted. "Avengers: Endgame", "endgame avengers" and
+    "AVENGERS-ENDGAME" all become "avengers endgame".
+    """
+    tokens = {TOKEN_ALIASES.get(token, token) for token in tokenize(query)}
+    return " ".join(sorted(tokens))
+
+
+def parse_query(query: str) -> dict:
+    """
+    Split a normalized query into field predicates and free words.
+
+    "bad breaking s02e05 720p hindi" gives season 2, episode 5, quality
+    ["720p"], langs [["hindi", "hin"]] and words ["bad", "breaking"].
+    Codecs come back as the canonical names the extractor stores (x264 ->
+    AVC). A year only counts as one next to other words, so "1917" or
+    "2012" on their own still search titles.
+    """
+    parsed = {"words": [], "season": None, "episode": None, "year": None,
+              "quality": None, "codec": None, "langs": []}
+    years = []
+    for word in query.split():
+        sxe = SXXEYY_RE.match(word)
+        ep = EPISODE_RE.match(word)
+        if sxe and parsed["season"] is None:
+            parsed["season"] = int(sxe.group(1))
+            if sxe.group(2):
+                parsed["episode"] = int(sxe.group(2))
+        elif ep and parsed["episode"] is None:
+            parsed["episode"] = int(ep.group(1))
+        elif (QUALITY_RE.match(word) or word in QUALITY_VALUES) and parsed["quality"] is None:
+            parsed["quality"] = QUALITY_VALUES.get(word, [word])
+        elif word in FAST_CODECS and parsed["codec"] is None:
+            parsed["codec"] = FAST_CODECS[word]
+        elif word in QUERY_LANGS:
+            parsed["langs"].append(QUERY_LANGS[word])
+        elif YEAR_RE.match(word):
+            years.append(word)
+        else:
+            parsed["words"].append(word)
+
+    if len(years) == 1 and (parsed["words"] or parsed["season"] is not None):
+        parsed["year"] = int(years[0])
+    else:
+        parsed["words"].extend(years)
+    return parsed